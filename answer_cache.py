@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from text_normalize import normalize_query
+
+
+def _filters_signature(filters) -> str:
+    """Stable string form of parse_menu_query filters ("" when none)."""
+    return json.dumps(filters, sort_keys=True) if filters else ""
+
+
+def _unit_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+class AnswerCache:
+    """
+    Cache of chat answers keyed by (restaurant slug, menu content hash,
+    normalized question, parsed query filters).
+
+    Each restaurant keeps a single bucket for its current menu hash; seeing a
+    new hash drops the old bucket, so menu edits invalidate answers
+    automatically. Entries may carry the question embedding to allow a
+    similarity match when the wording differs slightly; a similar question
+    only matches when its filters (price, spice, allergens) are equal, since
+    "sütsüz tatlılar" and "glutensiz tatlılar" embed almost identically.
+    """
+
+    def __init__(
+        self,
+        max_entries_per_restaurant: int = 200,
+        ttl: float = 21600.0,
+        similarity_threshold: float = 0.0,
+    ):
+        self.max_entries = max_entries_per_restaurant
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold > 0
+
+    def _bucket(self, restaurant_slug: str, menu_hash: str) -> OrderedDict:
+        current_hash, entries = self._buckets.get(restaurant_slug, (None, None))
+        if current_hash != menu_hash:
+            entries = OrderedDict()
+            self._buckets[restaurant_slug] = (menu_hash, entries)
+        return entries
+
+    def get(
+        self,
+        restaurant_slug: str,
+        menu_hash: str,
+        question: str,
+        embedding=None,
+        record_miss: bool = True,
+        filters=None,
+    ) -> tuple[dict | None, dict]:
+        """
+        Return (cached entry or None, match info). Pass record_miss=False for
+        a first exact-only probe that will be followed by a similarity lookup.
+        """
+        signature = _filters_signature(filters)
+        key = (normalize_query(question), signature)
+        now = time.monotonic()
+
+        with self._lock:
+            entries = self._bucket(restaurant_slug, menu_hash)
+            for expired in [k for k, e in entries.items() if e["expires_at"] <= now]:
+                del entries[expired]
+
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entry, {"hit": True, "match": "exact"}
+
+            candidates = []
+            if embedding is not None and self.semantic_enabled:
+                candidates = [
+                    (candidate_key, candidate["embedding"])
+                    for candidate_key, candidate in entries.items()
+                    if candidate_key[1] == signature and candidate.get("embedding") is not None
+                ]
+            if not candidates and record_miss:
+                self.misses += 1
+        if not candidates:
+            return None, {"hit": False}
+
+        # Score outside the lock: one matrix-vector product over the bucket
+        query = _unit_vector(embedding)
+        best_key, best_score = None, 0.0
+        if query is not None:
+            scores = np.stack([vector for _, vector in candidates]) @ query
+            best = int(np.argmax(scores))
+            best_key, best_score = candidates[best][0], float(scores[best])
+
+        with self._lock:
+            entries = self._bucket(restaurant_slug, menu_hash)
+            entry = entries.get(best_key) if best_score >= self.similarity_threshold else None
+            if entry is not None:
+                entries.move_to_end(best_key)
+                self.hits += 1
+                self.semantic_hits += 1
+                return entry, {
+                    "hit": True,
+                    "match": "semantic",
+                    "similarity": round(best_score, 4),
+                }
+            if record_miss:
+                self.misses += 1
+            return None, {"hit": False}
+
+    def set(
+        self,
+        restaurant_slug: str,
+        menu_hash: str,
+        question: str,
+        answer: str,
+        sources=None,
+        embedding=None,
+        filters=None,
+    ) -> None:
+        if self.max_entries <= 0 or not answer:
+            return
+
+        key = (normalize_query(question), _filters_signature(filters))
+        if embedding is not None:
+            embedding = _unit_vector(embedding)
+        with self._lock:
+            entries = self._bucket(restaurant_slug, menu_hash)
+            entries[key] = {
+                "answer": answer,
+                "sources": sources or [],
+                "embedding": embedding,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, restaurant_slug: str | None = None) -> None:
+        with self._lock:
+            if restaurant_slug is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(restaurant_slug, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "restaurants": len(self._buckets),
+                "entries": sum(len(e) for _, e in self._buckets.values()),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "similarity_threshold": self.similarity_threshold,
+            }
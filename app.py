@@ -1,10 +1,17 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, g
 import os
 import json
+import hashlib
+import shutil
+import tempfile
 from config import Config
-from rag_service import RestaurantRAGService
+from rag_service import get_rag_service, warm_up_rag_service
+from groq_service import invalidate_restaurant_prompt
 from firebase_config import firebase_service
+from index_queue import IndexQueue
+from bulk_indexer import BulkIndexRun
 from functools import wraps
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 app = Flask(__name__)
@@ -30,8 +37,41 @@ def inject_firebase_config():
         }
     }
 
-# Initialize RAG service (Groq + Pinecone menu search)
-ai_service = RestaurantRAGService()
+# The RAG service (Groq + Pinecone menu search) is built on first use; warm it
+# up in the background so worker boot doesn't block on network calls
+if Config.AI_WARMUP_ON_START:
+    warm_up_rag_service()
+
+# Cached per-restaurant system prompts follow restaurant edits
+firebase_service.on_restaurant_change(invalidate_restaurant_prompt)
+
+def run_menu_reindex(restaurant_slug, force):
+    """Index job body: re-read the menu from Firestore and sync the vector index"""
+    # The write may have been served by another worker; don't index a cached copy
+    firebase_service.invalidate_menu_cache(restaurant_slug)
+    if firebase_service.get_restaurant_menu_snapshot(restaurant_slug) is None:
+        # Firestore could not be read; raising puts the job on the retry path
+        # instead of recording "no menu" as a final result
+        raise RuntimeError(f'Menu for {restaurant_slug} could not be loaded from Firestore')
+    # Served from the snapshot just cached above
+    return get_rag_service().sync_menu_from_firestore(
+        restaurant_slug,
+        firebase_service.get_restaurant_menu,
+        force=force,
+    )
+
+# Menu saves queue reindexing instead of embedding inside the request
+index_queue = IndexQueue(
+    run_menu_reindex,
+    path=Config.INDEX_QUEUE_PATH,
+    workers=Config.INDEX_QUEUE_WORKERS,
+    max_attempts=Config.INDEX_QUEUE_MAX_ATTEMPTS,
+    retry_delay=Config.INDEX_QUEUE_RETRY_DELAY,
+)
+
+# Whole-catalogue reindex started from the admin panel; its state shares the
+# index queue's SQLite file so every worker sees the same run
+bulk_index_run = BulkIndexRun(Config.INDEX_QUEUE_PATH)
 
 # Authentication decorator
 def login_required(f):
@@ -42,7 +82,43 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def get_current_user():
+    """Resolve the signed-in user's principal (incl. role) at most once per request"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = firebase_service.get_user_by_uid(user_id) if user_id else None
+    return g.current_user
+
+# Role-based authorization decorator (use below @login_required)
+def role_required(*roles, redirect_endpoint=None):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user_info = get_current_user()
+            if not user_info or user_info.get('role') not in roles:
+                if redirect_endpoint:
+                    return redirect(url_for(redirect_endpoint))
+                return jsonify({'error': 'Unauthorized'}), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def cached_json_response(body, etag, private=False):
+    """Build a JSON response with ETag + Cache-Control that honours If-None-Match"""
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = (
+        f"{'private' if private else 'public'}, "
+        f"max-age={Config.HTTP_CACHE_MAX_AGE}, "
+        f"stale-while-revalidate={Config.HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+    )
+    # Turns the response into a bodyless 304 when the client's ETag matches
+    return response.make_conditional(request)
 
+def cached_jsonify(payload, private=False):
+    """Serialize payload like jsonify and serve it with a content-hash ETag"""
+    body = app.json.dumps(payload).encode('utf-8')
+    return cached_json_response(body, hashlib.md5(body).hexdigest(), private=private)
 
 @app.route('/')
 def index():
@@ -57,7 +133,7 @@ def get_featured_restaurants():
     """Get featured restaurants for homepage"""
     try:
         featured_restaurants = firebase_service.get_featured_restaurants()
-        return jsonify({
+        return cached_jsonify({
             'restaurants': featured_restaurants,
             'count': len(featured_restaurants)
         })
@@ -68,13 +144,15 @@ def get_featured_restaurants():
 def get_restaurant_menu(restaurant_slug):
     """Get restaurant menu by slug"""
     try:
-        menu_data = firebase_service.get_restaurant_menu(restaurant_slug)
-        
-        response_data = {
-            'restaurant_slug': restaurant_slug,
-            'menu': menu_data
-        }
-        return jsonify(response_data)
+        snapshot = firebase_service.get_restaurant_menu_snapshot(restaurant_slug)
+        if snapshot is None:
+            return jsonify({
+                'restaurant_slug': restaurant_slug,
+                'menu': []
+            })
+
+        # Serve the pre-serialized snapshot bytes instead of re-running jsonify
+        return cached_json_response(snapshot['body'], snapshot['etag'])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -108,38 +186,49 @@ def chat_with_ai():
         restaurant['id'] = restaurant_slug
         restaurant['slug'] = restaurant_slug
 
-        service = firebase_service.ai_service or ai_service
-        if service and service.is_available:
-            try:
-                usage_stats = firebase_service.get_user_usage_stats(session.get('user_id'))
-                extra = f"\n{frontend_context}\n{restaurant_info}".strip()
-                full_question = f"{question}\n{extra}" if extra else question
+        service = get_rag_service()
+        if service.is_available:
+            user_id = session.get('user_id')
 
+            # Check and count the message against the daily limit in one transaction
+            user_role = (get_current_user() or {}).get('role')
+            usage_stats = firebase_service.reserve_chat_message(user_id, role=user_role)
+            if not usage_stats['can_send']:
+                return jsonify({
+                    'error': usage_stats['reason'],
+                    'limits': usage_stats,
+                    'restaurant_slug': restaurant_slug,
+                }), 429
+
+            try:
                 result = service.ask_question(
-                    question=full_question,
+                    question=question,
                     restaurant_data=restaurant,
                     get_menu_fn=firebase_service.get_restaurant_menu,
                     chat_history=[],
                     usage_stats=usage_stats,
+                    extra_context=f"{frontend_context}\n{restaurant_info}".strip(),
                 )
 
                 if not result.get('success'):
+                    firebase_service.release_chat_message(user_id)
                     return jsonify({
                         'answer': result.get('error', 'AI yanıtı alınamadı.'),
                         'restaurant_slug': restaurant_slug,
                     }), 500
 
                 response = result['answer']
-                firebase_service.save_chat_message(session.get('user_id'), question, response)
-                usage_stats = firebase_service.get_user_usage_stats(session.get('user_id'))
 
                 return jsonify({
                     'answer': response,
                     'restaurant_slug': restaurant_slug,
                     'usage_stats': usage_stats,
                     'sources': result.get('sources', []),
+                    'cache': result.get('cache'),
+                    'prompt_tokens': result.get('prompt_tokens'),
                 })
             except Exception:
+                firebase_service.release_chat_message(user_id)
                 return jsonify({
                     'answer': 'Üzgünüm, şu anda AI servisimiz meşgul. Lütfen daha sonra tekrar deneyin.',
                     'restaurant_slug': restaurant_slug,
@@ -153,6 +242,87 @@ def chat_with_ai():
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
 
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+@login_required
+def chat_with_ai_stream():
+    """Chat with AI garson, streaming the answer as Server-Sent Events"""
+    data = request.get_json(silent=True)
+    if not data or 'question' not in data:
+        return jsonify({'error': 'Question required'}), 400
+    
+    question = data['question']
+    if len(question) > 150:
+        return jsonify({'error': 'Question too long'}), 400
+    
+    restaurant_slug = session.get('current_restaurant_slug')
+    if not restaurant_slug:
+        return jsonify({'error': 'Restaurant context not found'}), 400
+    
+    restaurant = firebase_service.get_restaurant_by_slug(restaurant_slug)
+    if not restaurant:
+        return jsonify({'error': 'Restaurant not found'}), 400
+    
+    restaurant['id'] = restaurant_slug
+    restaurant['slug'] = restaurant_slug
+
+    service = get_rag_service()
+    if not service.is_available:
+        return jsonify({
+            'error': 'Üzgünüm, AI servisimiz şu anda kullanılamıyor. Lütfen daha sonra tekrar deneyin.',
+            'restaurant_slug': restaurant_slug,
+        }), 503
+
+    user_id = session.get('user_id')
+    user_role = (get_current_user() or {}).get('role')
+    usage_stats = firebase_service.reserve_chat_message(user_id, role=user_role)
+    if not usage_stats['can_send']:
+        return jsonify({
+            'error': usage_stats['reason'],
+            'limits': usage_stats,
+            'restaurant_slug': restaurant_slug,
+        }), 429
+
+    extra_context = f"{data.get('context', '')}\n{data.get('restaurant_info', '')}".strip()
+
+    def generate():
+        completed = False
+        try:
+            for event, payload in service.stream_question(
+                question=question,
+                restaurant_data=restaurant,
+                get_menu_fn=firebase_service.get_restaurant_menu,
+                chat_history=[],
+                usage_stats=usage_stats,
+                extra_context=extra_context,
+            ):
+                if event == 'error':
+                    yield sse_event('error', {'error': payload})
+                    return
+                yield sse_event(event, payload)
+
+            completed = True
+            yield sse_event('done', {
+                'restaurant_slug': restaurant_slug,
+                'usage_stats': usage_stats,
+            })
+        except Exception:
+            yield sse_event('error', {
+                'error': 'Üzgünüm, şu anda AI servisimiz meşgul. Lütfen daha sonra tekrar deneyin.'
+            })
+        finally:
+            # Usage is settled once the stream ends: failed or aborted answers are not counted
+            if not completed:
+                firebase_service.release_chat_message(user_id)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 @app.route('/menu/<restaurant_slug>')
 def restaurant_menu(restaurant_slug):
     """Display restaurant menu page"""
@@ -269,104 +439,79 @@ def api_register():
 @login_required
 def profile_page():
     """User profile page (requires authentication)"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
+    user_info = get_current_user()
     return render_template('pages/profile.html', user=user_info)
 
 @app.route('/admin')
 @login_required
+@role_required('admin', redirect_endpoint='index')
 def admin_panel():
     """Admin panel page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return redirect(url_for('index'))
+    user_info = get_current_user()
     
     return render_template('admin/dashboard.html', user=user_info)
 
 @app.route('/admin/users')
 @login_required
+@role_required('admin', redirect_endpoint='index')
 def admin_users():
     """Admin users management page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return redirect(url_for('index'))
+    user_info = get_current_user()
     
     return render_template('admin/users.html', user=user_info)
 
 @app.route('/admin/restaurants')
 @login_required
+@role_required('admin', redirect_endpoint='index')
 def admin_restaurants():
     """Admin restaurants management page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return redirect(url_for('index'))
+    user_info = get_current_user()
     
     return render_template('admin/restaurants.html', user=user_info)
 
 @app.route('/admin/cuisines')
 @login_required
+@role_required('admin', redirect_endpoint='index')
 def admin_cuisines():
     """Admin cuisines management page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return redirect(url_for('index'))
+    user_info = get_current_user()
     
     return render_template('admin/cuisines.html', user=user_info)
 
 # Editor Panel Routes
 @app.route('/editor')
 @login_required
+@role_required('editor', 'admin', redirect_endpoint='index')
 def editor_dashboard():
     """Editor dashboard page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return redirect(url_for('index'))
+    user_info = get_current_user()
     
     return render_template('editor/dashboard.html', user=user_info)
 
 @app.route('/editor/restaurants')
 @login_required
+@role_required('editor', 'admin', redirect_endpoint='index')
 def editor_restaurants():
     """Editor restaurants management page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return redirect(url_for('home'))
+    user_info = get_current_user()
     
     return render_template('editor/restaurants.html', user=user_info)
 
 @app.route('/editor/profile')
 @login_required
+@role_required('editor', 'admin', redirect_endpoint='index')
 def editor_profile():
     """Editor profile page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return redirect(url_for('home'))
+    user_info = get_current_user()
     
     return render_template('editor/profile.html', user=user_info)
 
 @app.route('/editor/menus')
 @login_required
+@role_required('editor', 'admin', redirect_endpoint='index')
 def editor_menus():
     """Editor menus management page"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return redirect(url_for('home'))
+    user_info = get_current_user()
     
     return render_template('editor/menus.html', user=user_info)
 
@@ -400,8 +545,15 @@ def chat():
         if not restaurant_slug:
             return jsonify({'error': 'Restoran bilgisi bulunamadı'}), 400
         
-        # Check user limits BEFORE processing
-        limits = firebase_service.check_user_limits(user_id)
+        # Get restaurant data
+        restaurant = firebase_service.get_restaurant_by_slug(restaurant_slug)
+        if not restaurant:
+            return jsonify({'error': 'Restoran bulunamadı'}), 500
+        
+        # Check and count the message against the daily limit BEFORE processing
+        # (single transaction, so concurrent requests cannot both pass the check)
+        user_role = (get_current_user() or {}).get('role')
+        limits = firebase_service.reserve_chat_message(user_id, role=user_role)
         print(f"🔍 User limits check: {limits}")
         
         if not limits['can_send']:
@@ -412,45 +564,34 @@ def chat():
                 'success': False
             }), 429  # Too Many Requests
         
-        # Get restaurant data
-        restaurant = firebase_service.get_restaurant_by_slug(restaurant_slug)
-        if not restaurant:
-            return jsonify({'error': 'Restoran bulunamadı'}), 500
-        
         # Get chat history for context
         chat_history = firebase_service.get_user_chat_history(user_id, limit=10)
         
         restaurant['id'] = restaurant_slug
         restaurant['slug'] = restaurant_slug
 
-        current_usage_stats = firebase_service.get_user_usage_stats(user_id)
-
-        response = ai_service.ask_question(
-            question=question,
-            restaurant_data=restaurant,
-            get_menu_fn=firebase_service.get_restaurant_menu,
-            chat_history=chat_history,
-            usage_stats=current_usage_stats,
-        )
+        try:
+            response = get_rag_service().ask_question(
+                question=question,
+                restaurant_data=restaurant,
+                get_menu_fn=firebase_service.get_restaurant_menu,
+                chat_history=chat_history,
+                usage_stats=limits,
+            )
+        except Exception:
+            firebase_service.release_chat_message(user_id)
+            raise
 
         if response['success']:
-            print(f"💾 Saving chat message for user {user_id}")
-            # Save chat message to Firestore
-            save_result = firebase_service.save_chat_message(user_id, question, response['answer'])
-            print(f"💾 Save result: {save_result}")
-            
-            # Get updated usage stats
-            print(f"📊 Getting updated usage stats for user {user_id}")
-            usage_stats = firebase_service.get_user_usage_stats(user_id)
-            print(f"📊 Updated usage stats: {usage_stats}")
-            
             return jsonify({
                 'answer': response['answer'],
                 'success': True,
-                'usage_stats': usage_stats,
+                'usage_stats': limits,
                 'sources': response.get('sources', []),
+                'cache': response.get('cache'),
             })
         else:
+            firebase_service.release_chat_message(user_id)
             return jsonify({
                 'error': response['error'],
                 'success': False
@@ -462,7 +603,7 @@ def chat():
 @app.route('/api/ai-status')
 def ai_status():
     """Get AI service status"""
-    return jsonify(ai_service.get_status())
+    return jsonify(get_rag_service().get_status())
 
 @app.route('/api/auth/verify', methods=['POST'])
 def verify_token():
@@ -520,7 +661,7 @@ def auth_status():
         print(f"📧 User email in session: {user_email}")
         
         # Get user info from Firebase (includes role from Firestore users collection)
-        user_info = firebase_service.get_user_by_uid(user_id)
+        user_info = get_current_user()
         
         if user_info:
             user_role = user_info.get('role', 'subscriber')
@@ -571,8 +712,7 @@ def firebase_status():
 @login_required
 def user_role():
     """Get or update user role (admin only for updates)"""
-    user_id = session.get('user_id')
-    current_user = firebase_service.get_user_by_uid(user_id)
+    current_user = get_current_user()
     
     if request.method == 'GET':
         return jsonify({
@@ -628,7 +768,7 @@ def debug_user_info():
         firestore_user = firebase_service.find_user_by_email_in_firestore(user_email)
     
     # Get user info from our service
-    service_user = firebase_service.get_user_by_uid(user_id)
+    service_user = get_current_user()
     
     return jsonify({
         'session': {
@@ -645,8 +785,7 @@ def debug_user_info():
 @login_required
 def debug_users():
     """Debug endpoint to list all users and their roles (admin only)"""
-    user_id = session.get('user_id')
-    current_user = firebase_service.get_user_by_uid(user_id)
+    current_user = get_current_user()
     
     # Only admins can see all users
     if not current_user or current_user.get('role') != 'admin':
@@ -728,30 +867,28 @@ def reviews():
 # Admin API Endpoints
 @app.route('/api/admin/users')
 @login_required
+@role_required('admin')
 def admin_get_users():
     """Get all users for admin panel"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
-        users = firebase_service.get_all_users()
-        return jsonify(users)
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit <= 0:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        start_after = request.args.get('start_after')
+        users = firebase_service.get_all_users(limit=limit, start_after=start_after)
+        response = jsonify(users)
+        # Cursor for the next page; the body stays a plain list for the admin UI
+        if limit and len(users) == limit:
+            response.headers['X-Next-Cursor'] = users[-1]['uid']
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/admin/users/lookup', methods=['POST'])
 @login_required
+@role_required('admin')
 def admin_lookup_user():
     """Look up user by email for auto-filling forms"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         data = request.get_json()
         email = data.get('email')
@@ -771,14 +908,9 @@ def admin_lookup_user():
 
 @app.route('/api/admin/users/<uid>/role', methods=['PUT'])
 @login_required
+@role_required('admin')
 def admin_update_user_role(uid):
     """Update user role"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         data = request.get_json()
         new_role = data.get('role')
@@ -797,14 +929,9 @@ def admin_update_user_role(uid):
 
 @app.route('/api/admin/restaurants')
 @login_required
+@role_required('admin')
 def admin_get_restaurants():
     """Get all restaurants for admin panel"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         restaurants = firebase_service.get_all_restaurants()
         return jsonify(restaurants)
@@ -813,14 +940,9 @@ def admin_get_restaurants():
 
 @app.route('/api/admin/restaurants', methods=['POST'])
 @login_required
+@role_required('admin')
 def admin_create_restaurant():
     """Create new restaurant"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         data = request.get_json()
         
@@ -840,14 +962,9 @@ def admin_create_restaurant():
 
 @app.route('/api/admin/restaurants/<restaurant_slug>/assign-role', methods=['POST'])
 @login_required
+@role_required('admin')
 def admin_assign_restaurant_role(restaurant_slug):
     """Assign editor or owner role to restaurant"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         data = request.get_json()
         email = data.get('email')
@@ -870,14 +987,9 @@ def admin_assign_restaurant_role(restaurant_slug):
 
 @app.route('/api/admin/restaurants/<restaurant_slug>', methods=['PUT'])
 @login_required
+@role_required('admin')
 def admin_update_restaurant(restaurant_slug):
     """Update restaurant"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         data = request.get_json()
         success = firebase_service.update_restaurant(restaurant_slug, data)
@@ -891,14 +1003,9 @@ def admin_update_restaurant(restaurant_slug):
 
 @app.route('/api/admin/restaurants/<restaurant_slug>', methods=['DELETE'])
 @login_required
+@role_required('admin')
 def admin_delete_restaurant(restaurant_slug):
     """Delete restaurant"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 500
-    
     try:
         success = firebase_service.delete_restaurant(restaurant_slug)
         if success:
@@ -912,14 +1019,9 @@ def admin_delete_restaurant(restaurant_slug):
 # Cuisine Management API Endpoints
 @app.route('/api/admin/cuisines', methods=['GET'])
 @login_required
+@role_required('admin')
 def admin_get_cuisines():
     """Get all cuisines"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         cuisines = firebase_service.get_all_cuisines()
         return jsonify({'cuisines': cuisines})
@@ -928,14 +1030,9 @@ def admin_get_cuisines():
 
 @app.route('/api/admin/cuisines', methods=['POST'])
 @login_required
+@role_required('admin')
 def admin_create_cuisine():
     """Create a new cuisine"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         data = request.get_json()
         cuisine_id = firebase_service.create_cuisine(data)
@@ -945,14 +1042,9 @@ def admin_create_cuisine():
 
 @app.route('/api/admin/cuisines/<cuisine_id>', methods=['PUT'])
 @login_required
+@role_required('admin')
 def admin_update_cuisine(cuisine_id):
     """Update a cuisine"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         data = request.get_json()
         success = firebase_service.update_cuisine(cuisine_id, data)
@@ -965,14 +1057,9 @@ def admin_update_cuisine(cuisine_id):
 
 @app.route('/api/admin/cuisines/<cuisine_id>', methods=['DELETE'])
 @login_required
+@role_required('admin')
 def admin_delete_cuisine(cuisine_id):
     """Delete a cuisine"""
-    user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     try:
         success = firebase_service.delete_cuisine(cuisine_id)
         if success:
@@ -991,20 +1078,18 @@ def get_cuisines():
         cuisines = firebase_service.get_all_cuisines()
         # Filter only active cuisines for non-admin users
         active_cuisines = [cuisine for cuisine in cuisines if cuisine.get('isActive', True)]
-        return jsonify({'cuisines': active_cuisines})
+        # Behind login_required, so only the browser (not a shared CDN) may cache it
+        return cached_jsonify({'cuisines': active_cuisines}, private=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Editor API Endpoints
 @app.route('/api/editor/stats')
 @login_required
+@role_required('editor', 'admin')
 def editor_get_stats():
     """Get editor statistics"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         stats = firebase_service.get_editor_stats(user_id)
@@ -1014,13 +1099,10 @@ def editor_get_stats():
 
 @app.route('/api/editor/restaurants')
 @login_required
+@role_required('editor', 'admin')
 def editor_get_restaurants():
     """Get restaurants assigned to editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         restaurants = firebase_service.get_editor_restaurants(user_id)
@@ -1030,13 +1112,10 @@ def editor_get_restaurants():
 
 @app.route('/api/editor/restaurants/recent')
 @login_required
+@role_required('editor', 'admin')
 def editor_get_recent_restaurants():
     """Get recent restaurants assigned to editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         restaurants = firebase_service.get_editor_recent_restaurants(user_id)
@@ -1046,13 +1125,11 @@ def editor_get_recent_restaurants():
 
 @app.route('/api/editor/restaurants', methods=['POST'])
 @login_required
+@role_required('editor', 'admin')
 def editor_create_restaurant():
     """Create a new restaurant as editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
+    user_info = get_current_user()
     
     try:
         data = request.get_json()
@@ -1070,13 +1147,10 @@ def editor_create_restaurant():
 
 @app.route('/api/editor/restaurants/<restaurant_slug>', methods=['PUT'])
 @login_required
+@role_required('editor', 'admin')
 def editor_update_restaurant(restaurant_slug):
     """Update restaurant as editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         # Check if editor has permission to edit this restaurant
@@ -1094,13 +1168,10 @@ def editor_update_restaurant(restaurant_slug):
 
 @app.route('/api/editor/restaurants/<restaurant_slug>', methods=['DELETE'])
 @login_required
+@role_required('editor', 'admin')
 def editor_delete_restaurant(restaurant_slug):
     """Delete restaurant as editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         # Check if editor has permission to delete this restaurant
@@ -1120,7 +1191,7 @@ def editor_delete_restaurant(restaurant_slug):
 def index_restaurant_menu(restaurant_slug):
     """Sync restaurant menu from Firestore into Pinecone vector index."""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
+    user_info = get_current_user()
     role = (user_info or {}).get('role', 'subscriber')
 
     if role not in ('admin', 'editor', 'owner'):
@@ -1130,7 +1201,7 @@ def index_restaurant_menu(restaurant_slug):
     force = request.get_json(silent=True) or {}
     force_reindex = bool(force.get('force', False))
 
-    result = ai_service.sync_menu_from_firestore(
+    result = get_rag_service().sync_menu_from_firestore(
         restaurant_slug,
         firebase_service.get_restaurant_menu,
         force=force_reindex,
@@ -1142,32 +1213,101 @@ def index_restaurant_menu(restaurant_slug):
 @app.route('/api/menu/index-status/<restaurant_slug>')
 @login_required
 def menu_index_status(restaurant_slug):
-    """Return Pinecone + Groq service status for debugging."""
+    """Return Pinecone + Groq service status and the restaurant's reindex job."""
     return jsonify({
-        'ai': ai_service.get_status(),
+        'ai': get_rag_service().get_status(),
         'restaurant_slug': restaurant_slug,
+        'index_job': index_queue.get_job(restaurant_slug),
+        'index_queue': index_queue.get_status(),
     })
 
+@app.route('/api/admin/menu/index-all', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def admin_bulk_index_menus():
+    """Start (POST) or poll (GET) a bulk reindex of every active menu"""
+    if request.method == 'GET':
+        return jsonify(bulk_index_run.get_status())
+    
+    vector_store = get_rag_service().vector_store
+    if not vector_store.is_available:
+        return jsonify({'error': 'Vector store is not available'}), 503
+    
+    data = request.get_json(silent=True) or {}
+    started = bulk_index_run.start(
+        vector_store,
+        firebase_service.stream_active_menus,
+        force=bool(data.get('force', False)),
+    )
+    if not started:
+        return jsonify({'error': 'A bulk index run is already in progress', **bulk_index_run.get_status()}), 409
+    return jsonify(bulk_index_run.get_status()), 202
+
+
+def spool_image_upload():
+    """
+    The uploaded image as a binary file object, or None.
+
+    Accepts a multipart/form-data 'image' field (Werkzeug spools file parts
+    past 500 KB to disk) or a raw image/* or application/octet-stream body,
+    which is copied in chunks into a spooled temporary file. Bodies over
+    request.max_content_length are rejected with 413 while reading.
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        return upload.stream if upload else None
+
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        shutil.copyfileobj(request.stream, spool, 64 * 1024)
+        if not spool.tell():
+            return None
+        spool.seek(0)
+        return spool
+    return None
 
 # AI Image Analysis API Endpoint
 @app.route('/api/ai/analyze-menu-image', methods=['POST'])
 @login_required
 def analyze_menu_image():
-    """Analyze menu image using Groq vision"""
+    """Analyze menu image using Groq vision (multipart/raw upload, or base64 JSON)"""
+    max_bytes = Config.MENU_IMAGE_UPLOAD_MAX_BYTES
+    too_large = {'error': f'Image is too large (max {max_bytes // (1024 * 1024)} MB)'}
+    is_json = request.is_json
+    if is_json:
+        # Base64 is a third larger than the image it carries
+        max_bytes = max_bytes * 4 // 3 + 4096
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify(too_large), 413
+    # Also enforced while reading bodies sent without a Content-Length
+    request.max_content_length = max_bytes
+    
     try:
-        data = request.get_json()
-        image_base64 = data.get('image')
-        language = data.get('language', 'tr')
-                
-        if not image_base64:
-            return jsonify({'error': 'Image data is required'}), 400
-        
-        suggestions = ai_service.analyze_menu_image(image_base64, language)
+        if is_json:
+            data = request.get_json()
+            image_base64 = data.get('image')
+            language = data.get('language', 'tr')
+                    
+            if not image_base64:
+                return jsonify({'error': 'Image data is required'}), 400
+            
+            suggestions = get_rag_service().analyze_menu_image(image_base64, language)
+        else:
+            image_file = spool_image_upload()
+            language = request.form.get('language') or request.args.get('language', 'tr')
+            
+            if image_file is None:
+                return jsonify({'error': 'Image data is required'}), 400
+            
+            with image_file:
+                suggestions = get_rag_service().analyze_menu_image_file(image_file, language)
         
         print(f"🔍 AI analysis result: {suggestions}")
         
         return jsonify(suggestions)
         
+    except RequestEntityTooLarge:
+        return jsonify(too_large), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1176,8 +1316,9 @@ def analyze_menu_image():
 def test_ai():
     """Test if AI service is working"""
     try:
-        status = ai_service.get_status()
-        basic_test = ai_service.test_basic_functionality()
+        service = get_rag_service()
+        status = service.get_status()
+        basic_test = service.test_basic_functionality()
         
         return jsonify({
             'success': True,
@@ -1194,13 +1335,10 @@ def test_ai():
 # Editor Menu API Endpoints
 @app.route('/api/editor/menus')
 @login_required
+@role_required('editor', 'admin')
 def editor_get_menus():
     """Get menus for restaurants assigned to editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         menus = firebase_service.get_editor_menus(user_id)
@@ -1210,13 +1348,10 @@ def editor_get_menus():
 
 @app.route('/api/editor/menus', methods=['POST'])
 @login_required
+@role_required('editor', 'admin')
 def editor_create_menu():
     """Create a new menu as editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         data = request.get_json()
@@ -1226,25 +1361,17 @@ def editor_create_menu():
         
         menu_id = firebase_service.create_menu(data)
         restaurant_id = data.get('restaurantId')
-        if restaurant_id:
-            ai_service.sync_menu_from_firestore(
-                restaurant_id,
-                firebase_service.get_restaurant_menu,
-                force=True,
-            )
-        return jsonify({'message': 'Menu created successfully', 'id': menu_id})
+        index_job = index_queue.enqueue(restaurant_id, force=True) if restaurant_id else None
+        return jsonify({'message': 'Menu created successfully', 'id': menu_id, 'index_job': index_job})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/editor/menus/<menu_id>', methods=['PUT'])
 @login_required
+@role_required('editor', 'admin')
 def editor_update_menu(menu_id):
     """Update menu as editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         # Check if editor has permission to edit this menu
@@ -1255,13 +1382,8 @@ def editor_update_menu(menu_id):
         success = firebase_service.update_menu(menu_id, data)
         if success:
             restaurant_id = data.get('restaurantId')
-            if restaurant_id:
-                ai_service.sync_menu_from_firestore(
-                    restaurant_id,
-                    firebase_service.get_restaurant_menu,
-                    force=True,
-                )
-            return jsonify({'message': 'Menu updated successfully'})
+            index_job = index_queue.enqueue(restaurant_id, force=True) if restaurant_id else None
+            return jsonify({'message': 'Menu updated successfully', 'index_job': index_job})
         else:
             return jsonify({'error': 'Failed to update menu'}), 500
     except Exception as e:
@@ -1269,13 +1391,10 @@ def editor_update_menu(menu_id):
 
 @app.route('/api/editor/menus/<menu_id>', methods=['DELETE'])
 @login_required
+@role_required('editor', 'admin')
 def editor_delete_menu(menu_id):
     """Delete menu as editor"""
     user_id = session.get('user_id')
-    user_info = firebase_service.get_user_by_uid(user_id)
-    
-    if not user_info or user_info.get('role') not in ['editor', 'admin']:
-        return jsonify({'error': 'Unauthorized'}), 403
     
     try:
         # Check if editor has permission to delete this menu
@@ -1297,7 +1416,8 @@ def editor_delete_menu(menu_id):
 def get_usage_stats():
     """Get current user's usage statistics"""
     user_id = session.get('user_id')
-    usage_stats = firebase_service.get_user_usage_stats(user_id)
+    user_role = (get_current_user() or {}).get('role')
+    usage_stats = firebase_service.get_user_usage_stats(user_id, role=user_role)
     
     return jsonify({
         'success': True,
@@ -1315,7 +1435,7 @@ if __name__ == '__main__':
     Config.validate_config()
     
     # Show AI service status
-    ai_status = ai_service.get_status()
+    ai_status = get_rag_service().get_status()
     if ai_status.get('available'):
         groq = ai_status.get('groq', {})
         pinecone = ai_status.get('pinecone', {})
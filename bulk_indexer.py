@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Bulk (re)index every restaurant's active menu into the menu vector store.
+
+Usage:
+    python bulk_indexer.py [--force] [--workers N] [--slug SLUG ...] [--json]
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import Config
+
+
+def bulk_index_menus(vector_store, menus, force=False, workers=None, on_result=None) -> dict:
+    """
+    Index ``menus`` (an iterable of (slug, menu_data)) restaurants at a time.
+
+    Restaurants run on a thread pool while the store batches embeddings and
+    upserts underneath, so overall embed concurrency stays within the shared
+    rate-limit-aware limiter. At most ``2 * workers`` menus are held in
+    memory, so the iterable can stream from Firestore. Returns a report with
+    per-restaurant results and throughput.
+    """
+    workers = max(workers or Config.BULK_INDEX_WORKERS, 1)
+    started = time.monotonic()
+    results = []
+
+    def index_one(slug, menu_data):
+        t0 = time.monotonic()
+        try:
+            result = vector_store.index_restaurant_menu(slug, menu_data, force=force)
+        except Exception as exc:
+            result = {"success": False, "error": str(exc)}
+        result = {"restaurant_slug": slug, "seconds": round(time.monotonic() - t0, 3), **result}
+        if on_result:
+            on_result(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-index") as pool:
+        pending = set()
+        for slug, menu_data in menus:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            pending.add(pool.submit(index_one, slug, menu_data))
+        results.extend(future.result() for future in wait(pending).done)
+
+    elapsed = time.monotonic() - started
+    items = sum(r.get("indexed", 0) for r in results if r.get("success"))
+    return {
+        "restaurants": len(results),
+        "succeeded": sum(1 for r in results if r.get("success")),
+        "failed": sum(1 for r in results if not r.get("success")),
+        "skipped": sum(1 for r in results if r.get("skipped")),
+        "items_indexed": items,
+        "elapsed_seconds": round(elapsed, 2),
+        "items_per_second": round(items / elapsed, 2) if elapsed else 0.0,
+        "results": sorted(results, key=lambda r: r["restaurant_slug"]),
+    }
+
+
+class BulkIndexRun:
+    """
+    Background bulk index run for the admin endpoint, one at a time per host.
+
+    Run state lives in a SQLite file (the index queue's), so every gunicorn
+    worker reports the same run and a start request on another worker is
+    refused while it is going. A run whose worker died stops heartbeating
+    and may be replaced after ``stale_after`` seconds.
+    """
+
+    STATUS_IDLE = "idle"
+    STATUS_RUNNING = "running"
+
+    def __init__(self, path: str, stale_after: float = 600.0):
+        self.path = path
+        self.stale_after = stale_after
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS bulk_index_runs ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), run_id TEXT NOT NULL, status TEXT NOT NULL, "
+            "force INTEGER NOT NULL DEFAULT 0, started_at REAL, heartbeat_at REAL, "
+            "finished_at REAL, done INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, "
+            "report TEXT, error TEXT)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def start(self, vector_store, menus_fn, force=False, workers=None) -> bool:
+        """Start a run in the background; False if one is already running."""
+        now = time.time()
+        run_id = uuid.uuid4().hex
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT status, heartbeat_at FROM bulk_index_runs WHERE id = 1"
+            ).fetchone()
+            if (
+                row is not None
+                and row["status"] == self.STATUS_RUNNING
+                and row["heartbeat_at"] > now - self.stale_after
+            ):
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO bulk_index_runs "
+                "(id, run_id, status, force, started_at, heartbeat_at) VALUES (1, ?, ?, ?, ?, ?)",
+                (run_id, self.STATUS_RUNNING, int(force), now, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        threading.Thread(
+            target=self._run,
+            args=(run_id, vector_store, menus_fn, force, workers),
+            name="bulk-index-run",
+            daemon=True,
+        ).start()
+        return True
+
+    def _run(self, run_id, vector_store, menus_fn, force, workers):
+        def on_result(result):
+            # Only this run's row: a run taken over as stale must not count on
+            self._connect().execute(
+                "UPDATE bulk_index_runs SET done = done + 1, failed = failed + ?, "
+                "heartbeat_at = ? WHERE id = 1 AND run_id = ?",
+                (0 if result.get("success") else 1, time.time(), run_id),
+            )
+
+        try:
+            report = bulk_index_menus(
+                vector_store, menus_fn(), force=force, workers=workers, on_result=on_result
+            )
+            status, error = "finished", None
+        except Exception as exc:
+            print(f"❌ Bulk menu indexing failed: {exc}")
+            report, status, error = None, "error", str(exc)
+
+        self._connect().execute(
+            "UPDATE bulk_index_runs SET status = ?, finished_at = ?, report = ?, error = ? "
+            "WHERE id = 1 AND run_id = ?",
+            (
+                status,
+                time.time(),
+                json.dumps(report, ensure_ascii=False, default=str) if report else None,
+                error,
+                run_id,
+            ),
+        )
+
+    def get_status(self) -> dict:
+        row = self._connect().execute("SELECT * FROM bulk_index_runs WHERE id = 1").fetchone()
+        if row is None:
+            return {"status": self.STATUS_IDLE}
+
+        state = {
+            "status": row["status"],
+            "force": bool(row["force"]),
+            "started_at": row["started_at"],
+            "done": row["done"],
+            "failed": row["failed"],
+        }
+        if row["status"] == self.STATUS_RUNNING:
+            state["heartbeat_at"] = row["heartbeat_at"]
+        else:
+            state["finished_at"] = row["finished_at"]
+            if row["report"]:
+                state["report"] = json.loads(row["report"])
+            if row["error"]:
+                state["error"] = row["error"]
+        return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="skip the whole-menu hash check")
+    parser.add_argument("--workers", type=int, default=Config.BULK_INDEX_WORKERS,
+                        help="restaurants indexed concurrently")
+    parser.add_argument("--slug", action="append", help="only index these restaurants")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    from firebase_config import firebase_service
+    from rag_service import get_rag_service
+
+    vector_store = get_rag_service().vector_store
+    if not vector_store.is_available:
+        raise SystemExit("❌ Vector store is not available; check PINECONE_API_KEY.")
+    if Config.VECTOR_STORE == "local" and not Config.LOCAL_VECTOR_DIR:
+        print("⚠️ VECTOR_STORE=local without LOCAL_VECTOR_DIR: the index is lost when this exits.")
+
+    menus = firebase_service.stream_active_menus()
+    if args.slug:
+        wanted = set(args.slug)
+        menus = ((slug, menu) for slug, menu in menus if slug in wanted)
+
+    def on_result(result):
+        if result.get("success"):
+            state = "skipped" if result.get("skipped") else f"{result.get('indexed', 0)} items"
+            print(f"✅ {result['restaurant_slug']}: {state} ({result['seconds']}s)")
+        else:
+            print(f"❌ {result['restaurant_slug']}: {result.get('error')}")
+
+    report = bulk_index_menus(
+        vector_store, menus, force=args.force, workers=args.workers, on_result=on_result
+    )
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(
+        f"📊 {report['succeeded']}/{report['restaurants']} restaurants, "
+        f"{report['items_indexed']} items in {report['elapsed_seconds']}s "
+        f"({report['items_per_second']} items/s)"
+    )
+    raise SystemExit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,23 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+def _parse_role_limits(raw):
+    """Parse 'role:limit' pairs, e.g. 'editor:50,admin:100'"""
+    limits = {}
+    for pair in raw.split(','):
+        if ':' not in pair:
+            continue
+        role, limit = pair.split(':', 1)
+        limits[role.strip()] = int(limit)
+    return limits
+
 class Config:
     """Configuration class for the application"""
     
     # Flask configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    # gunicorn worker processes (the start commands pass it as --workers)
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '2'))
     
     # Groq AI configuration
     GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
@@ -17,6 +29,27 @@ class Config:
         'GROQ_VISION_MODEL',
         'meta-llama/llama-4-scout-17b-16e-instruct',
     )
+    # Menu photos are shrunk before the vision call: longest edge, JPEG byte
+    # budget, optional grayscale and cropping of uniform margins
+    MENU_IMAGE_MAX_EDGE = int(os.environ.get('MENU_IMAGE_MAX_EDGE', '1600'))
+    MENU_IMAGE_MAX_BYTES = int(os.environ.get('MENU_IMAGE_MAX_BYTES', '600000'))
+    MENU_IMAGE_GRAYSCALE = os.environ.get('MENU_IMAGE_GRAYSCALE', '0') == '1'
+    MENU_IMAGE_CROP_MARGINS = os.environ.get('MENU_IMAGE_CROP_MARGINS', '1') == '1'
+    # Largest menu photo upload accepted (bytes)
+    MENU_IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get('MENU_IMAGE_UPLOAD_MAX_BYTES', str(15 * 1024 * 1024)))
+    # Groq admission (per process): concurrent calls, seconds to wait for a
+    # free slot, per-call timeout, retries within a total retry budget, and
+    # the circuit breaker that fast-fails after consecutive failures. Menu
+    # photo analysis has its own slots and breaker
+    GROQ_MAX_CONCURRENCY = int(os.environ.get('GROQ_MAX_CONCURRENCY', '4'))
+    GROQ_VISION_MAX_CONCURRENCY = int(os.environ.get('GROQ_VISION_MAX_CONCURRENCY', '2'))
+    GROQ_QUEUE_TIMEOUT = float(os.environ.get('GROQ_QUEUE_TIMEOUT', '10'))
+    GROQ_TIMEOUT = float(os.environ.get('GROQ_TIMEOUT', '30'))
+    GROQ_MAX_ATTEMPTS = int(os.environ.get('GROQ_MAX_ATTEMPTS', '3'))
+    GROQ_RETRY_BASE_DELAY = float(os.environ.get('GROQ_RETRY_BASE_DELAY', '1'))
+    GROQ_RETRY_BUDGET = float(os.environ.get('GROQ_RETRY_BUDGET', '20'))
+    GROQ_BREAKER_FAILURES = int(os.environ.get('GROQ_BREAKER_FAILURES', '5'))
+    GROQ_BREAKER_RESET = float(os.environ.get('GROQ_BREAKER_RESET', '30'))
     
     # Pinecone vector database configuration
     PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
@@ -26,6 +59,69 @@ class Config:
     PINECONE_EMBED_MODEL = os.environ.get('PINECONE_EMBED_MODEL', 'multilingual-e5-large')
     PINECONE_EMBED_DIMENSION = int(os.environ.get('PINECONE_EMBED_DIMENSION', '1024'))
     RAG_TOP_K = int(os.environ.get('RAG_TOP_K', '8'))
+    # Prompt size limits (estimated tokens): whole prompt, menu context within
+    # it, each item description, and the extra context sent by the page
+    PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '2000'))
+    PROMPT_MENU_CONTEXT_MAX_TOKENS = int(os.environ.get('PROMPT_MENU_CONTEXT_MAX_TOKENS', '1200'))
+    PROMPT_DESCRIPTION_MAX_TOKENS = int(os.environ.get('PROMPT_DESCRIPTION_MAX_TOKENS', '40'))
+    PROMPT_EXTRA_CONTEXT_MAX_TOKENS = int(os.environ.get('PROMPT_EXTRA_CONTEXT_MAX_TOKENS', '200'))
+    # Build the Groq/Pinecone clients on a background thread at worker start
+    # instead of on the first AI request
+    AI_WARMUP_ON_START = os.environ.get('AI_WARMUP_ON_START', '1') == '1'
+    # 'pinecone' (serverless index) or 'local' (in-process NumPy index, Pinecone
+    # still used for embeddings); LOCAL_VECTOR_DIR persists local indexes and
+    # shares them between the workers on a host
+    VECTOR_STORE = os.environ.get('VECTOR_STORE', 'pinecone').lower()
+    LOCAL_VECTOR_DIR = os.environ.get('LOCAL_VECTOR_DIR', '')
+    # Fuse vector matches with BM25/trigram matches (reciprocal rank fusion)
+    HYBRID_SEARCH_ENABLED = os.environ.get('HYBRID_SEARCH_ENABLED', '1') == '1'
+    HYBRID_RRF_K = int(os.environ.get('HYBRID_RRF_K', '60'))
+    # Embedding / index write throughput (multilingual-e5-large takes up to 96 inputs per call)
+    EMBED_BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', '96'))
+    EMBED_CONCURRENCY = int(os.environ.get('EMBED_CONCURRENCY', '4'))
+    UPSERT_CONCURRENCY = int(os.environ.get('UPSERT_CONCURRENCY', '4'))
+    BULK_INDEX_WORKERS = int(os.environ.get('BULK_INDEX_WORKERS', '4'))
+    # Seconds before the chat path re-checks a menu it has seen indexed (0 = never)
+    MENU_INDEX_RECHECK_INTERVAL = int(os.environ.get('MENU_INDEX_RECHECK_INTERVAL', '21600'))
+    # Query embedding cache; set a SQLite path to persist it across restarts
+    EMBEDDING_CACHE_MAX_SIZE = int(os.environ.get('EMBEDDING_CACHE_MAX_SIZE', '2048'))
+    EMBEDDING_CACHE_SQLITE_PATH = os.environ.get('EMBEDDING_CACHE_SQLITE_PATH', '')
+    EMBEDDING_CACHE_MAX_DISK_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_DISK_ENTRIES', '50000'))
+    
+    # Chat answer cache (per restaurant + menu version); a similarity threshold
+    # of 0 disables embedding-based matching of differently worded questions
+    ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', '1') == '1'
+    ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', '21600'))
+    ANSWER_CACHE_MAX_PER_RESTAURANT = int(os.environ.get('ANSWER_CACHE_MAX_PER_RESTAURANT', '200'))
+    ANSWER_CACHE_SIMILARITY = float(os.environ.get('ANSWER_CACHE_SIMILARITY', '0'))
+    
+    # In-process caches (per gunicorn worker)
+    RESTAURANT_CACHE_TTL = int(os.environ.get('RESTAURANT_CACHE_TTL', '300'))
+    RESTAURANT_CACHE_MAX_SIZE = int(os.environ.get('RESTAURANT_CACHE_MAX_SIZE', '512'))
+    MENU_CACHE_TTL = int(os.environ.get('MENU_CACHE_TTL', '300'))
+    MENU_CACHE_MAX_SIZE = int(os.environ.get('MENU_CACHE_MAX_SIZE', '256'))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))
+    USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '2048'))
+    
+    # HTTP caching for public read endpoints (browsers / CDN)
+    HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', '60'))
+    HTTP_CACHE_STALE_WHILE_REVALIDATE = int(os.environ.get('HTTP_CACHE_STALE_WHILE_REVALIDATE', '300'))
+    
+    # Chat quotas
+    CHAT_DAILY_LIMIT = int(os.environ.get('CHAT_DAILY_LIMIT', '10'))
+    CHAT_DAILY_LIMITS_BY_ROLE = _parse_role_limits(os.environ.get('CHAT_DAILY_LIMITS_BY_ROLE', ''))
+    # 'firestore' (transaction per message), 'memory' (single process) or
+    # 'sqlite' (all workers on one host); local engines sync to Firestore in batches.
+    # 'memory' falls back to 'sqlite' when WEB_CONCURRENCY > 1
+    QUOTA_ENGINE = os.environ.get('QUOTA_ENGINE', 'firestore')
+    QUOTA_SQLITE_PATH = os.environ.get('QUOTA_SQLITE_PATH', '/tmp/smartqrmenu-quota.db')
+    QUOTA_FLUSH_INTERVAL = float(os.environ.get('QUOTA_FLUSH_INTERVAL', '5'))
+    
+    # Background menu reindex queue (SQLite file shared by the workers on a host)
+    INDEX_QUEUE_PATH = os.environ.get('INDEX_QUEUE_PATH', '/tmp/smartqrmenu-index-queue.db')
+    INDEX_QUEUE_WORKERS = int(os.environ.get('INDEX_QUEUE_WORKERS', '1'))
+    INDEX_QUEUE_MAX_ATTEMPTS = int(os.environ.get('INDEX_QUEUE_MAX_ATTEMPTS', '5'))
+    INDEX_QUEUE_RETRY_DELAY = float(os.environ.get('INDEX_QUEUE_RETRY_DELAY', '5'))
     
     # Restaurant data file
     RESTAURANT_DATA_FILE = 'restaurant.json'
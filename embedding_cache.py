@@ -0,0 +1,149 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from text_normalize import turkish_lower
+
+
+def _to_blob(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _from_blob(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of embedding vectors keyed by (model, input_type, text).
+
+    Vectors are kept as packed float32 bytes (4 bytes per dimension instead
+    of a list of Python floats). With ``sqlite_path`` set, entries are also
+    written to a local SQLite file so they survive restarts and are shared
+    by the workers on a host; the file holds at most ``max_disk_entries``.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        sqlite_path: str | None = None,
+        max_disk_entries: int = 50000,
+    ):
+        self.max_size = max_size
+        self.sqlite_path = sqlite_path or None
+        self.max_disk_entries = max_disk_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.sqlite_path:
+            try:
+                self._connect().execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+                )
+            except Exception as exc:
+                print(f"⚠️ Embedding cache file disabled: {exc}")
+                self.sqlite_path = None
+
+    @staticmethod
+    def make_key(model: str, input_type: str, text: str) -> str:
+        normalized = " ".join(turkish_lower(text).split())
+        return hashlib.sha1(f"{model}\0{input_type}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.sqlite_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, blob: bytes) -> None:
+        with self._lock:
+            self._data[key] = blob
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            blob = self._data.get(key)
+            if blob is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return _from_blob(blob)
+
+        if self.sqlite_path:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    self._remember(key, row[0])
+                    with self._lock:
+                        self.hits += 1
+                        self.disk_hits += 1
+                    return _from_blob(row[0])
+            except Exception as exc:
+                print(f"⚠️ Embedding cache read failed: {exc}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, vector) -> None:
+        if self.max_size <= 0 or not vector:
+            return
+
+        blob = _to_blob(vector)
+        self._remember(key, blob)
+
+        if self.sqlite_path:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    (key, blob, time.time()),
+                )
+                with self._lock:
+                    self._disk_writes += 1
+                    prune = self._disk_writes % self.PRUNE_EVERY == 0
+                if prune:
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key NOT IN ("
+                        "SELECT key FROM embeddings ORDER BY last_used DESC LIMIT ?)",
+                        (self.max_disk_entries,),
+                    )
+            except Exception as exc:
+                print(f"⚠️ Embedding cache write failed: {exc}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "bytes": sum(len(blob) for blob in self._data.values()),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "sqlite_path": self.sqlite_path,
+            }
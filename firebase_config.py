@@ -1,20 +1,47 @@
+import copy
+import hashlib
+import json
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
 from config import Config
-from rag_service import RestaurantRAGService
+from quota_engine import InMemoryQuotaEngine, SQLiteQuotaEngine
+from ttl_cache import TTLCache
 
 class FirebaseService:
     """Firebase service for authentication and database operations"""
     
+    # Maximum number of values Firestore accepts in an 'in' filter
+    FIRESTORE_IN_QUERY_LIMIT = 30
+    # Maximum number of identifiers accepted by auth.get_users
+    AUTH_GET_USERS_LIMIT = 100
+    # Maximum number of writes in a single Firestore batch
+    FIRESTORE_BATCH_LIMIT = 500
+    
     def __init__(self):
         """Initialize Firebase services"""
         self.admin_app = None
         self.auth = None
         self.firestore_db = None
         self.is_available = False
+        self.quota_engine = None
+        self._restaurant_cache = TTLCache(
+            max_size=Config.RESTAURANT_CACHE_MAX_SIZE,
+            ttl=Config.RESTAURANT_CACHE_TTL,
+        )
+        self._menu_snapshot_cache = TTLCache(
+            max_size=Config.MENU_CACHE_MAX_SIZE,
+            ttl=Config.MENU_CACHE_TTL,
+        )
+        self._user_cache = TTLCache(
+            max_size=Config.USER_CACHE_MAX_SIZE,
+            ttl=Config.USER_CACHE_TTL,
+        )
+        # Called with the slug whenever a restaurant's cached data is dropped
+        self._restaurant_change_listeners = []
         
         try:
             # Initialize Firebase Admin SDK
@@ -75,14 +102,7 @@ class FirebaseService:
                 self.is_available = False
             else:
                 print("✅ Firestore DB is available")
-            
-            # Initialize RAG service (Groq + Pinecone)
-            try:
-                self.ai_service = RestaurantRAGService()
-                print("✅ AI RAG service initialized successfully")
-            except Exception as ai_error:
-                print(f"⚠️ AI RAG service initialization failed: {ai_error}")
-                self.ai_service = None
+                self.quota_engine = self._init_quota_engine()
                 
         except Exception as e:
             print(f"❌ Failed to initialize Firebase: {e}")
@@ -101,17 +121,29 @@ class FirebaseService:
             return None
     
     def get_user_by_uid(self, uid):
-        """Get user information by UID"""
+        """Get user information by UID (cached briefly, invalidated on role changes)"""
         if not self.admin_app:
             return None
         
+        cached = self._user_cache.get(uid)
+        if cached is not None:
+            return dict(cached)
+        
         try:
             user = auth.get_user(uid)
             
-            # Get user role from Firestore
-            user_role = self.get_user_role(uid)
+            # Get user role from Firestore; the fallback role used when that
+            # read fails is not cached, so a blip can't demote an admin for the TTL
+            role_loaded = False
+            user_role = 'subscriber'
+            if self.firestore_db:
+                try:
+                    user_role = self._load_user_role(uid)
+                    role_loaded = True
+                except Exception as e:
+                    print(f"❌ Failed to get user role for {uid}: {e}")
             
-            return {
+            user_info = {
                 'uid': user.uid,
                 'email': user.email,
                 'display_name': user.display_name,
@@ -119,10 +151,20 @@ class FirebaseService:
                 'email_verified': user.email_verified,
                 'role': user_role
             }
+            if role_loaded:
+                self._user_cache.set(uid, user_info)
+            return dict(user_info)
         except Exception as e:
             print(f"Failed to get user: {e}")
             return None
     
+    def invalidate_user_cache(self, uid=None):
+        """Drop one cached user principal (or all of them when no uid is given)"""
+        if uid is None:
+            self._user_cache.clear()
+        else:
+            self._user_cache.invalidate(uid)
+    
     def get_user_role(self, uid):
         """Get user role from Firestore"""
         if not self.firestore_db:
@@ -130,22 +172,22 @@ class FirebaseService:
             return 'subscriber'  # Default role
         
         try:
-            
-            # Get user role from Firestore users collection
-            user_doc = self.firestore_db.collection('users').document(uid).get()
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                role = user_data.get('role', 'subscriber')
-                print(f"✅ User {uid} role from Firestore: {role}")
-                return role
-            else:
-                print(f"⚠️ User {uid} not found in Firestore users collection, using default role: subscriber")
-                return 'subscriber'  # Default role
-            
+            return self._load_user_role(uid)
         except Exception as e:
             print(f"❌ Failed to get user role for {uid}: {e}")
             return 'subscriber'
     
+    def _load_user_role(self, uid):
+        """Read the role from the users collection (raises if Firestore fails)"""
+        user_doc = self.firestore_db.collection('users').document(uid).get()
+        if user_doc.exists:
+            user_data = user_doc.to_dict()
+            role = user_data.get('role', 'subscriber')
+            print(f"✅ User {uid} role from Firestore: {role}")
+            return role
+        print(f"⚠️ User {uid} not found in Firestore users collection, using default role: subscriber")
+        return 'subscriber'  # Default role
+    
     def set_user_role(self, uid, role):
         """Set user role in Firestore"""
         if not self.firestore_db:
@@ -163,6 +205,7 @@ class FirebaseService:
                 'role': role,
                 'updated_at': firestore.SERVER_TIMESTAMP
             }, merge=True)
+            self.invalidate_user_cache(uid)
             
             return True
             
@@ -170,30 +213,42 @@ class FirebaseService:
             print(f"Failed to set user role: {e}")
             return False
     
-    def get_all_users(self):
-        """Get all users from Firestore"""
+    def get_all_users(self, limit=None, start_after=None):
+        """Get users from Firestore, optionally one page at a time.
+        
+        Pages are ordered by document id; pass the last uid of the previous
+        page as start_after to fetch the next one. The cursor is the id
+        itself, so it stays valid even if that user has since been deleted.
+        """
+        if limit is not None and limit <= 0:
+            raise ValueError('limit must be a positive integer')
         if not self.firestore_db:
             return []
         
         try:
-            users = []
-            users_ref = self.firestore_db.collection('users').stream()
+            users_query = self.firestore_db.collection('users')
+            if limit or start_after:
+                users_query = users_query.order_by(firestore.FieldPath.document_id())
+            if start_after:
+                users_query = users_query.start_after({firestore.FieldPath.document_id(): start_after})
+            if limit:
+                users_query = users_query.limit(limit)
             
-            for user_doc in users_ref:
+            users = []
+            for user_doc in users_query.stream():
                 user_data = user_doc.to_dict()
                 user_data['uid'] = user_doc.id
-                
-                # Get additional info from Firebase Auth if available
-                try:
-                    auth_user = self.auth.get_user(user_doc.id)
+                users.append(user_data)
+            
+            # Get additional info from Firebase Auth if available
+            auth_users = self._get_auth_users_by_uid([user['uid'] for user in users])
+            for user_data in users:
+                auth_user = auth_users.get(user_data['uid'])
+                if auth_user:
                     user_data['email'] = auth_user.email
                     user_data['display_name'] = auth_user.display_name
                     user_data['photo_url'] = auth_user.photo_url
                     user_data['email_verified'] = auth_user.email_verified
-                except:
-                    pass
-                
-                users.append(user_data)
             
             return users
             
@@ -201,6 +256,23 @@ class FirebaseService:
             print(f"Failed to get all users: {e}")
             return []
     
+    def _get_auth_users_by_uid(self, uids):
+        """Batch-fetch Firebase Auth records, keyed by uid"""
+        if not self.auth or not uids:
+            return {}
+        
+        auth_users = {}
+        for i in range(0, len(uids), self.AUTH_GET_USERS_LIMIT):
+            chunk = uids[i:i + self.AUTH_GET_USERS_LIMIT]
+            try:
+                result = self.auth.get_users([auth.UidIdentifier(uid) for uid in chunk])
+                for auth_user in result.users:
+                    auth_users[auth_user.uid] = auth_user
+            except Exception as e:
+                print(f"⚠️ Failed to batch-fetch auth users: {e}")
+        
+        return auth_users
+    
     def list_users_with_roles(self):
         """List all users with their roles for debugging"""
         if not self.firestore_db:
@@ -258,6 +330,7 @@ class FirebaseService:
                     'role': new_role,
                     'updated_at': firestore.SERVER_TIMESTAMP
                 })
+                self.invalidate_user_cache(uid)
                 
                 print(f"✅ Updated role for {email} to {new_role}")
                 return True
@@ -312,18 +385,24 @@ class FirebaseService:
             return []
     
     def get_restaurant_by_slug(self, slug):
-        """Get restaurant by slug from Firestore"""
+        """Get restaurant by slug (cached per worker, invalidated on writes)"""
         if not self.firestore_db:
             return None
         
+        cached = self._restaurant_cache.get(slug)
+        if cached is not None:
+            # Callers mutate the returned dict, so never hand out the cached one
+            return copy.deepcopy(cached)
+        
         try:
             restaurant_doc = self.firestore_db.collection('restaurants').document(slug).get()
             
             if restaurant_doc.exists:
                 restaurant_data = restaurant_doc.to_dict()
                 restaurant_data['id'] = restaurant_doc.id
+                self._restaurant_cache.set(slug, restaurant_data)
                 print(f"✅ Retrieved restaurant: {restaurant_data.get('name', 'Unknown')}")
-                return restaurant_data
+                return copy.deepcopy(restaurant_data)
             else:
                 print(f"❌ Restaurant not found with slug: {slug}")
                 return None
@@ -332,11 +411,39 @@ class FirebaseService:
             print(f"❌ Error getting restaurant by slug: {e}")
             return None
     
+    def invalidate_restaurant_cache(self, restaurant_slug=None):
+        """Drop one cached restaurant (or all of them when no slug is given)"""
+        if restaurant_slug is None:
+            self._restaurant_cache.clear()
+        else:
+            self._restaurant_cache.invalidate(restaurant_slug)
+        for listener in self._restaurant_change_listeners:
+            listener(restaurant_slug)
+    
+    def on_restaurant_change(self, listener):
+        """Register listener(restaurant_slug) to run when a restaurant is updated or deleted"""
+        self._restaurant_change_listeners.append(listener)
+    
     def get_restaurant_menu(self, restaurant_slug):
-        """Get restaurant menu from Firestore"""
+        """Get restaurant menu (served from the in-memory menu snapshot)"""
+        snapshot = self.get_restaurant_menu_snapshot(restaurant_slug)
+        if snapshot is None:
+            return []
+        return copy.deepcopy(snapshot['menu'])
+    
+    def get_restaurant_menu_snapshot(self, restaurant_slug):
+        """Get the active 'tr' menu as a pre-serialized snapshot.
+        
+        Returns a dict with the menu data, the JSON body of the public menu
+        endpoint and its ETag, or None if Firestore could not be queried.
+        """
         if not self.firestore_db:
             print("❌ Firestore DB not available")
-            return []
+            return None
+        
+        snapshot = self._menu_snapshot_cache.get(restaurant_slug)
+        if snapshot is not None:
+            return snapshot
         
         try:
             print(f"🍽️ Getting menu for restaurant: {restaurant_slug}")
@@ -352,22 +459,92 @@ class FirebaseService:
                 print(f"✅ Retrieved real menu from Firestore for restaurant: {restaurant_slug}")
                 print(f"📋 Menu ID: {menu_doc.id}")
                 print(f"📋 Menu has {len(menu_data.get('categories', []))} categories")
-                print(f"📋 Menu language: {menu_data.get('language', 'unknown')}")
-                print(f"📋 Menu data: {menu_data}")
                 # Return full menu data including name, description, and categories
-                return {
+                menu = {
                     'name': menu_data.get('name', ''),
                     'description': menu_data.get('description', ''),
                     'categories': menu_data.get('categories', [])
                 }
             else:
                 print(f"⚠️ No active menu found in Firestore for {restaurant_slug} with language 'tr'")
-                print(f"🔍 Query: restaurantId={restaurant_slug}, language=tr, isActive=true")
-                return []
+                menu = []
+            
+            snapshot = self._build_menu_snapshot(restaurant_slug, menu)
+            self._menu_snapshot_cache.set(restaurant_slug, snapshot)
+            return snapshot
             
         except Exception as e:
             print(f"❌ Error getting restaurant menu: {e}")
-            return []
+            return None
+    
+    def stream_active_menus(self, language='tr', page_size=50):
+        """Yield (restaurant_slug, menu) for every restaurant's active menu.
+        
+        Reads the menus collection in pages of page_size documents (ordered by
+        document id, resuming after the last one) instead of querying per
+        restaurant, so a slow consumer never holds a Firestore stream open.
+        Like get_restaurant_menu, the first active menu of a restaurant wins.
+        """
+        if not self.firestore_db:
+            return
+        
+        seen = set()
+        menus_query = (
+            self.firestore_db.collection('menus')
+            .where('language', '==', language)
+            .where('isActive', '==', True)
+            .order_by(firestore.FieldPath.document_id())
+            .limit(page_size)
+        )
+        last_doc = None
+        while True:
+            page_query = menus_query.start_after(last_doc) if last_doc is not None else menus_query
+            menu_docs = list(page_query.stream())
+            for menu_doc in menu_docs:
+                menu_data = menu_doc.to_dict()
+                restaurant_slug = menu_data.get('restaurantId')
+                if not restaurant_slug or restaurant_slug in seen:
+                    continue
+                seen.add(restaurant_slug)
+                yield restaurant_slug, {
+                    'name': menu_data.get('name', ''),
+                    'description': menu_data.get('description', ''),
+                    'categories': menu_data.get('categories', [])
+                }
+            if len(menu_docs) < page_size:
+                return
+            last_doc = menu_docs[-1]
+    
+    def _build_menu_snapshot(self, restaurant_slug, menu):
+        """Serialize a menu once so the public endpoint can return raw bytes"""
+        body = json.dumps(
+            {'restaurant_slug': restaurant_slug, 'menu': menu},
+            ensure_ascii=False,
+            separators=(',', ':'),
+            default=str
+        ).encode('utf-8')
+        return {
+            'menu': menu,
+            'body': body,
+            'etag': hashlib.md5(body).hexdigest()
+        }
+    
+    def invalidate_menu_cache(self, restaurant_slug=None):
+        """Drop one cached menu snapshot (or all of them when no slug is given)"""
+        if restaurant_slug is None:
+            self._menu_snapshot_cache.clear()
+        else:
+            self._menu_snapshot_cache.invalidate(restaurant_slug)
+    
+    def _get_menu_restaurant_id(self, menu_id):
+        """Look up which restaurant a menu document belongs to"""
+        try:
+            doc = self.firestore_db.collection('menus').document(menu_id).get()
+            if doc.exists:
+                return doc.to_dict().get('restaurantId')
+        except Exception as e:
+            print(f"⚠️ Could not resolve restaurant for menu {menu_id}: {e}")
+        return None
     
     def create_restaurant(self, restaurant_data):
         """Create new restaurant in Firestore"""
@@ -423,6 +600,7 @@ class FirebaseService:
             
             # Create restaurant with slug as document ID
             self.firestore_db.collection('restaurants').document(slug).set(restaurant_doc)
+            self.invalidate_restaurant_cache(slug)
             
             print(f"✅ Restaurant created successfully with slug: {slug}")
             return True
@@ -691,6 +869,7 @@ class FirebaseService:
                     'updated_at': firestore.SERVER_TIMESTAMP
                 })
             
+            self.invalidate_restaurant_cache(restaurant_slug)
             print(f"✅ {role} role assigned to {email} for restaurant {restaurant_slug}")
             return True
             
@@ -747,6 +926,7 @@ class FirebaseService:
             
             # Update restaurant using slug
             self.firestore_db.collection('restaurants').document(restaurant_slug).update(restaurant_data)
+            self.invalidate_restaurant_cache(restaurant_slug)
             print(f"✅ Restaurant updated successfully: {restaurant_slug}")
             return True
             
@@ -761,6 +941,7 @@ class FirebaseService:
         
         try:
             self.firestore_db.collection('restaurants').document(restaurant_slug).delete()
+            self.invalidate_restaurant_cache(restaurant_slug)
             print(f"✅ Restaurant deleted successfully: {restaurant_slug}")
             return True
             
@@ -775,18 +956,23 @@ class FirebaseService:
             return []
         
         try:
+            # Tally restaurants per cuisine in a single pass instead of one
+            # array_contains query per cuisine
+            restaurant_counts = {}
+            restaurants_ref = self.firestore_db.collection('restaurants').select(['cuisineTypes'])
+            for restaurant_doc in restaurants_ref.stream():
+                cuisine_types = (restaurant_doc.to_dict() or {}).get('cuisineTypes') or []
+                # array_contains matches a restaurant once even if a cuisine is repeated
+                for cuisine_name in set(cuisine_types):
+                    restaurant_counts[cuisine_name] = restaurant_counts.get(cuisine_name, 0) + 1
+            
             cuisines_ref = self.firestore_db.collection('cuisines')
             cuisines = []
             
             for doc in cuisines_ref.stream():
                 cuisine_data = doc.to_dict()
                 cuisine_data['id'] = doc.id
-                
-                # Get restaurant count for this cuisine
-                restaurants_ref = self.firestore_db.collection('restaurants')
-                restaurant_count = len(list(restaurants_ref.where('cuisineTypes', 'array_contains', cuisine_data['name']).stream()))
-                cuisine_data['restaurantCount'] = restaurant_count
-                
+                cuisine_data['restaurantCount'] = restaurant_counts.get(cuisine_data.get('name'), 0)
                 cuisines.append(cuisine_data)
             
             print(f"✅ Retrieved {len(cuisines)} cuisines")
@@ -1004,24 +1190,42 @@ class FirebaseService:
             restaurants_ref = self.firestore_db.collection('restaurants')
             editor_restaurants = list(restaurants_ref.where('editor.userId', '==', editor_id).stream())
             
-            restaurant_ids = [doc.id for doc in editor_restaurants]
+            # Restaurant id -> name, resolved once for every menu below
+            restaurant_names = {
+                doc.id: (doc.to_dict() or {}).get('name', 'Unknown Restaurant')
+                for doc in editor_restaurants
+            }
+            restaurant_ids = list(restaurant_names)
             
             if not restaurant_ids:
                 return []
             
-            # Get menus for these restaurants
+            # Firestore 'in' filters accept at most 30 values, so load menus in
+            # chunks and run the chunk queries concurrently
             menus_ref = self.firestore_db.collection('menus')
-            menus = []
+            chunks = [
+                restaurant_ids[i:i + self.FIRESTORE_IN_QUERY_LIMIT]
+                for i in range(0, len(restaurant_ids), self.FIRESTORE_IN_QUERY_LIMIT)
+            ]
+            
+            def load_chunk(chunk):
+                return list(menus_ref.where('restaurantId', 'in', chunk).stream())
             
-            for restaurant_id in restaurant_ids:
-                restaurant_menus = list(menus_ref.where('restaurantId', '==', restaurant_id).stream())
-                for doc in restaurant_menus:
+            if len(chunks) == 1:
+                chunk_results = [load_chunk(chunks[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(len(chunks), 8)) as executor:
+                    chunk_results = list(executor.map(load_chunk, chunks))
+            
+            menus = []
+            for menu_docs in chunk_results:
+                for doc in menu_docs:
                     menu_data = doc.to_dict()
                     menu_data['id'] = doc.id
                     # Add restaurant name for display
-                    restaurant_doc = next((r for r in editor_restaurants if r.id == restaurant_id), None)
-                    if restaurant_doc:
-                        menu_data['restaurantName'] = restaurant_doc.to_dict().get('name', 'Unknown Restaurant')
+                    restaurant_id = menu_data.get('restaurantId')
+                    if restaurant_id in restaurant_names:
+                        menu_data['restaurantName'] = restaurant_names[restaurant_id]
                     menus.append(menu_data)
             
             print(f"✅ Retrieved {len(menus)} menus for editor {editor_id}")
@@ -1051,6 +1255,8 @@ class FirebaseService:
             
             doc_ref = self.firestore_db.collection('menus').document()
             doc_ref.set(menu_doc)
+            if menu_doc['restaurantId']:
+                self.invalidate_menu_cache(menu_doc['restaurantId'])
             
             print(f"✅ Menu created: {menu_data.get('name')} (ID: {doc_ref.id})")
             return doc_ref.id
@@ -1076,8 +1282,13 @@ class FirebaseService:
                 'updatedAt': firestore.SERVER_TIMESTAMP
             }
             
+            previous_restaurant_id = self._get_menu_restaurant_id(menu_id)
+            
             doc_ref = self.firestore_db.collection('menus').document(menu_id)
             doc_ref.update(menu_doc)
+            for restaurant_id in {previous_restaurant_id, menu_doc['restaurantId']}:
+                if restaurant_id:
+                    self.invalidate_menu_cache(restaurant_id)
             
             print(f"✅ Menu updated: {menu_id}")
             return True
@@ -1092,8 +1303,12 @@ class FirebaseService:
             return False
         
         try:
+            restaurant_id = self._get_menu_restaurant_id(menu_id)
+            
             doc_ref = self.firestore_db.collection('menus').document(menu_id)
             doc_ref.delete()
+            if restaurant_id:
+                self.invalidate_menu_cache(restaurant_id)
             
             print(f"✅ Menu deleted: {menu_id}")
             return True
@@ -1182,6 +1397,7 @@ class FirebaseService:
             
             if update_data:
                 auth.update_user(uid, **update_data)
+                self.invalidate_user_cache(uid)
                 return True
             return False
         except Exception as e:
@@ -1195,45 +1411,13 @@ class FirebaseService:
         
         try:
             auth.delete_user(uid)
+            self.invalidate_user_cache(uid)
             return True
         except Exception as e:
             print(f"Failed to delete user: {e}")
             return False
     
     # Firestore Database Operations
-    def save_chat_message(self, user_id, question, answer, timestamp=None):
-        """Update daily message count in messages_limits collection (no chat history)"""
-        if not self.firestore_db:
-            return False
-        
-        try:
-            # Get current date for daily tracking
-            from datetime import datetime
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            
-            # Update user usage statistics (increment count by 1)
-            self._update_user_usage(user_id, current_date)
-            
-            return True
-        except Exception as e:
-            print(f"Failed to update message count: {e}")
-            return False
-    
-    def _update_user_usage(self, user_id, current_date):
-        """Update user's daily usage statistics in messages_limits collection"""
-        try:
-            # Update daily usage in messages_limits collection
-            limit_ref = self.firestore_db.collection('messages_limits').document(f"{user_id}_{current_date}")
-            limit_ref.set({
-                'user_id': user_id,
-                'date': current_date,
-                'count': firestore.Increment(1),
-                'last_updated': firestore.SERVER_TIMESTAMP
-            }, merge=True)
-            
-        except Exception as e:
-            print(f"Failed to update user usage: {e}")
-    
     # _cleanup_old_messages method removed - no chat history needed
     
     def get_user_chat_history(self, user_id, limit=10):
@@ -1312,64 +1496,156 @@ class FirebaseService:
             print(f"Failed to get reviews: {e}")
             return []
     
-    def check_user_limits(self, user_id):
-        """Check if user has exceeded daily message limit (10 messages per day)"""
+    def get_daily_message_limit(self, role=None):
+        """Daily chat message limit for a role (falls back to CHAT_DAILY_LIMIT)"""
+        return Config.CHAT_DAILY_LIMITS_BY_ROLE.get(role, Config.CHAT_DAILY_LIMIT)
+    
+    def _messages_limit_ref(self, user_id, current_date):
+        return self.firestore_db.collection('messages_limits').document(f"{user_id}_{current_date}")
+    
+    def _load_message_count(self, user_id, current_date):
+        """Read the persisted daily message count (used to seed the local quota engine)"""
+        limit_doc = self._messages_limit_ref(user_id, current_date).get()
+        return limit_doc.to_dict().get('count', 0) if limit_doc.exists else 0
+    
+    def _flush_message_counts(self, pending):
+        """Write aggregated quota increments to messages_limits in batched writes"""
+        items = list(pending.items())
+        for i in range(0, len(items), self.FIRESTORE_BATCH_LIMIT):
+            batch = self.firestore_db.batch()
+            for (user_id, current_date), delta in items[i:i + self.FIRESTORE_BATCH_LIMIT]:
+                batch.set(self._messages_limit_ref(user_id, current_date), {
+                    'user_id': user_id,
+                    'date': current_date,
+                    'count': firestore.Increment(delta),
+                    'last_updated': firestore.SERVER_TIMESTAMP
+                }, merge=True)
+            batch.commit()
+    
+    def _init_quota_engine(self):
+        """Create the local quota engine selected by QUOTA_ENGINE (None = Firestore only)"""
+        engine = Config.QUOTA_ENGINE
+        if engine == 'memory' and Config.WEB_CONCURRENCY > 1:
+            # Each worker would count separately, multiplying the daily limit
+            print(f"⚠️ QUOTA_ENGINE=memory needs a single worker (WEB_CONCURRENCY={Config.WEB_CONCURRENCY}), using sqlite")
+            engine = 'sqlite'
+        if engine == 'memory':
+            return InMemoryQuotaEngine(
+                self._load_message_count,
+                self._flush_message_counts,
+                flush_interval=Config.QUOTA_FLUSH_INTERVAL,
+            )
+        if engine == 'sqlite':
+            return SQLiteQuotaEngine(
+                Config.QUOTA_SQLITE_PATH,
+                self._load_message_count,
+                self._flush_message_counts,
+                flush_interval=Config.QUOTA_FLUSH_INTERVAL,
+            )
+        if engine != 'firestore':
+            print(f"⚠️ Unknown QUOTA_ENGINE '{engine}', using Firestore transactions")
+        return None
+    
+    def _get_daily_message_count(self, user_id, current_date):
+        if self.quota_engine:
+            return self.quota_engine.peek(user_id, current_date)
+        return self._load_message_count(user_id, current_date)
+    
+    def get_user_usage_stats(self, user_id, role=None):
+        """Get user's current daily usage statistics"""
         if not self.firestore_db:
-            return {'can_send': False, 'reason': 'Database not available'}
+            return {}
         
         try:
             from datetime import datetime
             current_date = datetime.now().strftime('%Y-%m-%d')
             
-            # Check daily limit (10 messages per day) from messages_limits collection
-            limit_ref = self.firestore_db.collection('messages_limits').document(f"{user_id}_{current_date}")
-            limit_doc = limit_ref.get()
-            daily_messages = limit_doc.to_dict().get('count', 0) if limit_doc.exists else 0
-            
-            # Check limit
-            daily_limit = 10
-            
-            if daily_messages >= daily_limit:
-                return {
-                    'can_send': False,
-                    'reason': 'Günlük mesaj limitiniz doldu (10 mesaj)',
-                    'daily_used': daily_messages,
-                    'daily_limit': daily_limit
-                }
+            daily_messages = self._get_daily_message_count(user_id, current_date)
+            daily_limit = self.get_daily_message_limit(role)
             
             return {
-                'can_send': True,
                 'daily_used': daily_messages,
-                'daily_limit': daily_limit
+                'daily_limit': daily_limit,
+                'daily_remaining': max(daily_limit - daily_messages, 0)
             }
             
         except Exception as e:
-            print(f"Failed to check user limits: {e}")
-            return {'can_send': False, 'reason': 'Limit kontrolü yapılamadı'}
+            print(f"Failed to get user usage stats: {e}")
+            return {}
     
-    def get_user_usage_stats(self, user_id):
-        """Get user's current daily usage statistics from messages_limits collection"""
+    def reserve_chat_message(self, user_id, role=None):
+        """Atomically check the daily limit and count one message against it.
+        
+        With a local quota engine the decision is made in-process and the
+        increment is synced to messages_limits in the background; otherwise it
+        runs as a single Firestore transaction on messages_limits/<uid>_<date>.
+        Either way concurrent requests cannot both slip past the limit. Returns
+        the limit decision together with the post-increment usage stats.
+        """
         if not self.firestore_db:
-            return {}
+            return {'can_send': False, 'reason': 'Database not available'}
         
         try:
             from datetime import datetime
             current_date = datetime.now().strftime('%Y-%m-%d')
+            daily_limit = self.get_daily_message_limit(role)
             
-            # Get daily usage from messages_limits collection
-            limit_ref = self.firestore_db.collection('messages_limits').document(f"{user_id}_{current_date}")
-            limit_doc = limit_ref.get()
-            daily_messages = limit_doc.to_dict().get('count', 0) if limit_doc.exists else 0
+            if self.quota_engine:
+                daily_used, reserved = self.quota_engine.reserve(user_id, current_date, daily_limit)
+            else:
+                limit_ref = self._messages_limit_ref(user_id, current_date)
+                
+                @firestore.transactional
+                def reserve(transaction):
+                    limit_doc = limit_ref.get(transaction=transaction)
+                    daily_messages = limit_doc.to_dict().get('count', 0) if limit_doc.exists else 0
+                    if daily_messages >= daily_limit:
+                        return daily_messages, False
+                    
+                    transaction.set(limit_ref, {
+                        'user_id': user_id,
+                        'date': current_date,
+                        'count': daily_messages + 1,
+                        'last_updated': firestore.SERVER_TIMESTAMP
+                    }, merge=True)
+                    return daily_messages + 1, True
+                
+                daily_used, reserved = reserve(self.firestore_db.transaction())
             
-            return {
-                'daily_used': daily_messages,
-                'daily_limit': 10,
-                'daily_remaining': 10 - daily_messages
+            result = {
+                'can_send': reserved,
+                'daily_used': daily_used,
+                'daily_limit': daily_limit,
+                'daily_remaining': max(daily_limit - daily_used, 0)
             }
+            if not reserved:
+                result['reason'] = f'Günlük mesaj limitiniz doldu ({daily_limit} mesaj)'
+            return result
             
         except Exception as e:
-            print(f"Failed to get user usage stats: {e}")
-            return {}
+            print(f"Failed to reserve chat message: {e}")
+            return {'can_send': False, 'reason': 'Limit kontrolü yapılamadı'}
+    
+    def release_chat_message(self, user_id):
+        """Give back a message reserved by reserve_chat_message (e.g. when the AI call failed)"""
+        if not self.firestore_db:
+            return False
+        
+        try:
+            from datetime import datetime
+            current_date = datetime.now().strftime('%Y-%m-%d')
+            if self.quota_engine:
+                self.quota_engine.release(user_id, current_date)
+                return True
+            
+            self._messages_limit_ref(user_id, current_date).update({
+                'count': firestore.Increment(-1),
+                'last_updated': firestore.SERVER_TIMESTAMP
+            })
+            return True
+        except Exception as e:
+            print(f"Failed to release chat message: {e}")
+            return False
     
     def verify_id_token(self, id_token):
         """Verify Firebase ID token"""
@@ -1405,6 +1681,7 @@ class FirebaseService:
                     'updated_at': firestore.SERVER_TIMESTAMP
                 }
                 self.firestore_db.collection('users').document(uid).set(user_data)
+                self.invalidate_user_cache(uid)
                 print(f"✅ User document created in Firestore for {email}")
                 return True
             else:
@@ -1421,7 +1698,11 @@ class FirebaseService:
             'available': self.is_available,
             'admin_sdk': bool(self.admin_app),
             'firestore': bool(self.firestore_db),
-            'config_complete': bool(self.is_available)
+            'config_complete': bool(self.is_available),
+            'restaurant_cache': self._restaurant_cache.get_stats(),
+            'menu_cache': self._menu_snapshot_cache.get_stats(),
+            'user_cache': self._user_cache.get_stats(),
+            'quota_engine': self.quota_engine.get_status() if self.quota_engine else {'engine': 'firestore'}
         }
 
 # Global Firebase service instance
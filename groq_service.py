@@ -1,26 +1,96 @@
 import base64
+import hashlib
 import io
 import json
+import random
+import threading
+import time
+from contextlib import contextmanager
 
 from groq import Groq
-from PIL import Image
 
 from config import Config
+from image_preprocess import prepare_menu_image
+from prompt_budget import estimate_message_tokens, fit_lines, truncate_to_tokens
+from rate_limit import CircuitBreaker, SingleFlight, is_transient_error, retry_after_seconds
+from ttl_cache import TTLCache
+
+
+class GroqUnavailableError(RuntimeError):
+    """Groq was not called: its circuit is open or no request slot freed up in time."""
+
+
+def is_groq_unavailable(exc: Exception) -> bool:
+    """True for failures a fallback answer should cover (overload, outage, rate limit)."""
+    return isinstance(exc, GroqUnavailableError) or is_transient_error(exc)
+
+
+class _GroqLane:
+    """Request slots and circuit breaker for one kind of Groq call."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.breaker = CircuitBreaker(Config.GROQ_BREAKER_FAILURES, Config.GROQ_BREAKER_RESET)
+
+    def get_stats(self) -> dict:
+        return {"max_concurrency": self.max_concurrency, "circuit": self.breaker.get_stats()}
+
+
+# Shared by every client in the process: caps concurrent Groq calls so a slow
+# or rate-limiting upstream can't tie up every worker thread, merges identical
+# in-flight chat prompts, and stops calling Groq while it keeps failing. Menu
+# photo analysis is slow and uses another model, so it gets its own lane and
+# can't starve (or trip the breaker for) chat
+_chat_lane = _GroqLane(Config.GROQ_MAX_CONCURRENCY)
+_vision_lane = _GroqLane(Config.GROQ_VISION_MAX_CONCURRENCY)
+_groq_inflight = SingleFlight()
+
+# Restaurant fields that go into the cached system prompt
+_RESTAURANT_CARD_FIELDS = (
+    "name", "description", "cuisineTypes", "tags", "phone", "email", "website", "address", "hours",
+)
+# slug → (card fingerprint, system prompt, estimated tokens)
+_restaurant_prompts = TTLCache(max_size=Config.RESTAURANT_CACHE_MAX_SIZE, ttl=24 * 3600)
+
+
+def invalidate_restaurant_prompt(restaurant_slug=None):
+    """Drop a restaurant's cached system prompt (all restaurants if None)."""
+    if restaurant_slug is None:
+        _restaurant_prompts.clear()
+    else:
+        _restaurant_prompts.invalidate(restaurant_slug)
 
 
 class GroqAIService:
     """Groq LLM service for chat and menu image analysis."""
 
+    # Earlier chat turns and the restaurant description are shortened to
+    # these many (estimated) tokens before they go into a prompt
+    HISTORY_MESSAGE_MAX_TOKENS = 150
+    RESTAURANT_DESCRIPTION_MAX_TOKENS = 80
+
     def __init__(self):
         self.api_key = Config.GROQ_API_KEY
         self.chat_model = Config.GROQ_CHAT_MODEL
         self.vision_model = Config.GROQ_VISION_MODEL
+        self.queue_timeout = Config.GROQ_QUEUE_TIMEOUT
+        self.max_attempts = max(Config.GROQ_MAX_ATTEMPTS, 1)
+        self.retry_base_delay = Config.GROQ_RETRY_BASE_DELAY
+        self.retry_budget = Config.GROQ_RETRY_BUDGET
+        self.prompt_token_budget = Config.PROMPT_TOKEN_BUDGET
+        self.menu_context_max_tokens = Config.PROMPT_MENU_CONTEXT_MAX_TOKENS
         self.client = None
         self.is_available = False
 
         if self.api_key:
             try:
-                self.client = Groq(api_key=self.api_key)
+                # Retries are ours (_create), so the SDK's own are turned off
+                self.client = Groq(
+                    api_key=self.api_key,
+                    timeout=Config.GROQ_TIMEOUT,
+                    max_retries=0,
+                )
                 self.is_available = True
                 print(
                     f"✅ Groq AI initialized (chat={self.chat_model}, "
@@ -31,18 +101,116 @@ class GroqAIService:
         else:
             print("⚠️ GROQ_API_KEY not provided. AI features disabled.")
 
+    @contextmanager
+    def _admission(self, lane: _GroqLane):
+        """
+        Hold one of the lane's process-wide Groq request slots. Called after
+        the breaker admitted the call, so a half-open probe that never gets a
+        slot is handed back.
+        """
+        if not lane.slots.acquire(timeout=self.queue_timeout):
+            lane.breaker.cancel_probe()
+            raise GroqUnavailableError("Groq is busy; no request slot freed up in time")
+        try:
+            yield
+        finally:
+            lane.slots.release()
+
+    @contextmanager
+    def _completion(self, lane: _GroqLane, **request):
+        """
+        chat.completions.create behind the lane's slots and circuit breaker,
+        retrying transient errors with jittered backoff (or the server's
+        retry-after) while the retry budget lasts. The slot is held for each
+        attempt and while the caller uses the response (e.g. reads a stream),
+        but not during backoff sleeps.
+        """
+        deadline = time.monotonic() + self.retry_budget
+        for attempt in range(1, self.max_attempts + 1):
+            # Checked before queueing for a slot: an open circuit fails fast
+            if not lane.breaker.allow():
+                raise GroqUnavailableError(
+                    f"Groq circuit is open; retrying in {lane.breaker.retry_in():.1f}s"
+                )
+            with self._admission(lane):
+                try:
+                    response = self.client.chat.completions.create(**request)
+                except Exception as exc:
+                    if not is_transient_error(exc):
+                        # Groq answered; the request itself was rejected
+                        lane.breaker.record_success()
+                        raise
+                    lane.breaker.record_failure()
+
+                    delay = retry_after_seconds(exc)
+                    if delay is None:
+                        delay = self.retry_base_delay * 2 ** (attempt - 1)
+                    delay += random.uniform(0, self.retry_base_delay)
+                    if attempt == self.max_attempts or time.monotonic() + delay > deadline:
+                        raise
+                    print(f"⚠️ Groq call failed ({exc}); retry {attempt} in {delay:.1f}s")
+                else:
+                    lane.breaker.record_success()
+                    yield response
+                    return
+            time.sleep(delay)
+
     def _chat_completion(self, messages, model=None, temperature=0.4, max_tokens=512):
         if not self.is_available:
             raise RuntimeError("Groq AI service is not available")
 
-        response = self.client.chat.completions.create(
+        request = {
+            "model": model or self.chat_model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        # Identical prompts in flight at the same time share one Groq call
+        key = hashlib.sha1(
+            json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        return _groq_inflight.do(key, self._admitted_completion, _chat_lane, request)
+
+    def _vision_completion(self, messages, temperature=0.2, max_tokens=4096):
+        """Vision model call on its own lane; photos are unique, so no coalescing."""
+        if not self.is_available:
+            raise RuntimeError("Groq AI service is not available")
+
+        return self._admitted_completion(
+            _vision_lane,
+            {
+                "model": self.vision_model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+        )
+
+    def _admitted_completion(self, lane, request):
+        with self._completion(lane, **request) as response:
+            content = response.choices[0].message.content
+        return content.strip() if content else ""
+
+    def _chat_completion_stream(self, messages, model=None, temperature=0.4, max_tokens=512):
+        """Yield content deltas as Groq generates them."""
+        if not self.is_available:
+            raise RuntimeError("Groq AI service is not available")
+
+        # The slot is held until the stream is consumed or closed
+        with self._completion(
+            _chat_lane,
             model=model or self.chat_model,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
-        )
-        content = response.choices[0].message.content
-        return content.strip() if content else ""
+            stream=True,
+        ) as stream:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
 
     def get_response(self, system_prompt, user_prompt):
         """Simple text generation with system + user messages."""
@@ -76,66 +244,161 @@ class GroqAIService:
                 "answer": None,
             }
 
-        restaurant = restaurant_data or {}
-        system_prompt = self._build_system_prompt(restaurant, menu_context, usage_stats)
-        messages = [{"role": "system", "content": system_prompt}]
-
-        if chat_history:
-            for msg in chat_history[-5:]:
-                role = msg.get("role", "user")
-                if role not in ("user", "assistant"):
-                    role = "user" if role == "user" else "assistant"
-                messages.append(
-                    {
-                        "role": role,
-                        "content": msg.get("content", ""),
-                    }
-                )
-
-        messages.append({"role": "user", "content": question})
+        messages, prompt_tokens = self._build_messages(
+            question, restaurant_data, menu_context, chat_history, usage_stats
+        )
 
         try:
             answer = self._chat_completion(messages)
-            return {"success": True, "answer": answer, "error": None}
+            return {"success": True, "answer": answer, "error": None, "prompt_tokens": prompt_tokens}
         except Exception as exc:
             return {
                 "success": False,
                 "error": f"AI yanıtı oluşturulurken hata: {exc}",
                 "answer": None,
+                "unavailable": is_groq_unavailable(exc),
+                "prompt_tokens": prompt_tokens,
             }
 
-    def _build_system_prompt(self, restaurant, menu_context, usage_stats=None):
-        hours = restaurant.get("hours") or {}
-        limits_info = ""
-        if usage_stats:
-            limits_info = (
-                f"\nKullanım: günlük {usage_stats.get('daily_used', 0)}/"
-                f"{usage_stats.get('daily_limit', 10)} mesaj."
-            )
+    def stream_answer_with_context(
+        self,
+        question,
+        restaurant_data,
+        menu_context,
+        chat_history=None,
+        usage_stats=None,
+    ):
+        """Like answer_with_context, but yields the answer text as it is generated."""
+        messages, _ = self._build_messages(
+            question, restaurant_data, menu_context, chat_history, usage_stats
+        )
+        yield from self._chat_completion_stream(messages)
 
+    def _build_messages(
+        self,
+        question,
+        restaurant_data,
+        menu_context,
+        chat_history=None,
+        usage_stats=None,
+    ):
+        """
+        Returns (messages, estimated_prompt_tokens), kept within the prompt
+        token budget: menu context lines (ranked, best first) are kept while
+        they fit, and if even a minimal menu context doesn't fit the oldest
+        history turns are dropped first.
+        """
+        restaurant = restaurant_data or {}
+        history = []
+        if chat_history:
+            for msg in chat_history[-5:]:
+                role = msg.get("role", "user")
+                if role not in ("user", "assistant"):
+                    role = "user" if role == "user" else "assistant"
+                history.append(
+                    {
+                        "role": role,
+                        "content": truncate_to_tokens(
+                            msg.get("content", ""), self.HISTORY_MESSAGE_MAX_TOKENS
+                        ),
+                    }
+                )
+        system_prompt, system_tokens = self._system_prompt(restaurant)
+        fixed_tokens = (
+            system_tokens
+            + estimate_message_tokens(
+                [{"role": "user", "content": self._build_user_content(question, "", usage_stats)}]
+            )
+        )
+        min_menu_tokens = min(self.menu_context_max_tokens, self.prompt_token_budget // 4)
+        while history and (
+            fixed_tokens + estimate_message_tokens(history) + min_menu_tokens
+            > self.prompt_token_budget
+        ):
+            history.pop(0)
+
+        menu_budget = min(
+            self.menu_context_max_tokens,
+            self.prompt_token_budget - fixed_tokens - estimate_message_tokens(history),
+        )
+        menu_context = self._fit_menu_context(menu_context, menu_budget)
+
+        # Static system prompt first and per-request parts last, so prompts for
+        # a restaurant share the longest possible prefix (provider-side caching)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            *history,
+            {"role": "user", "content": self._build_user_content(question, menu_context, usage_stats)},
+        ]
+        return messages, estimate_message_tokens(messages)
+
+    def _fit_menu_context(self, menu_context, max_tokens):
+        """Keep whole menu lines, in rank order, within ``max_tokens``."""
+        lines = [line for line in (menu_context or "").splitlines() if line.strip()]
+        kept, dropped = fit_lines(lines, max_tokens)
+        if not kept and lines:
+            # Not even the best match fits whole: keep a shortened version of it
+            first = truncate_to_tokens(lines[0], max_tokens)
+            kept, dropped = ([first], len(lines) - 1) if first else ([], len(lines))
+        if dropped and kept:
+            kept.append(f"(ve {dropped} ürün daha; yer kısıtı nedeniyle listelenmedi)")
+        return "\n".join(kept)
+
+    def _system_prompt(self, restaurant):
+        """
+        (system_prompt, estimated_tokens) for a restaurant, built once per
+        restaurant and reused until its card fields change or
+        invalidate_restaurant_prompt() drops it.
+        """
+        slug = restaurant.get("id") or restaurant.get("slug")
+        fingerprint = repr([restaurant.get(field) for field in _RESTAURANT_CARD_FIELDS])
+        cached = _restaurant_prompts.get(slug) if slug else None
+        if cached and cached[0] == fingerprint:
+            return cached[1], cached[2]
+
+        prompt = self._build_system_prompt(restaurant)
+        tokens = estimate_message_tokens([{"role": "system", "content": prompt}])
+        if slug:
+            _restaurant_prompts.set(slug, (fingerprint, prompt, tokens))
+        return prompt, tokens
+
+    def _build_system_prompt(self, restaurant):
+        """Persona and rules (same for every restaurant), then the restaurant card."""
+        hours = restaurant.get("hours") or {}
         return f"""Sen bu restoranın garsonusun. Müşteri sorularına kısa, net ve Türkçe cevap ver.
 Cevapların 2-3 cümleyi geçmesin. Her seferinde selamlama yapma.
 
+Kurallar:
+1. Önce müşteri mesajıyla gelen menü bilgilerini kullan.
+2. Bilgi yoksa "Bu konuda menümüzde bilgi bulunmuyor" de.
+3. Fiyat ve ürün adlarını menü bilgilerinden ver; uydurma.
+4. Önceki mesajlarla tutarlı ol.
+
 Restoran:
 - Ad: {restaurant.get('name', 'Bilinmiyor')}
-- Açıklama: {restaurant.get('description', 'Bilinmiyor')}
+- Açıklama: {truncate_to_tokens(restaurant.get('description') or '', self.RESTAURANT_DESCRIPTION_MAX_TOKENS) or 'Bilinmiyor'}
 - Mutfak: {', '.join(restaurant.get('cuisineTypes', []))}
 - Etiketler: {', '.join(restaurant.get('tags', []))}
 - Telefon: {restaurant.get('phone', 'Bilinmiyor')}
 - E-posta: {restaurant.get('email', 'Bilinmiyor')}
 - Website: {restaurant.get('website', 'Bilinmiyor')}
 - Adres: {restaurant.get('address', 'Bilinmiyor')}
-- Saatler: {hours.get('open', '?')} - {hours.get('close', '?')}
-{limits_info}
+- Saatler: {hours.get('open', '?')} - {hours.get('close', '?')}"""
 
-Menüden ilgili bilgiler (vektör arama sonucu):
+    def _build_user_content(self, question, menu_context, usage_stats=None):
+        """The per-request turn: retrieved menu items, usage, then the question."""
+        limits_info = ""
+        if usage_stats:
+            limits_info = (
+                f"\nKullanım: günlük {usage_stats.get('daily_used', 0)}/"
+                f"{usage_stats.get('daily_limit', 10)} mesaj."
+            )
+
+        return f"""Menüden ilgili bilgiler (vektör arama sonucu):
 {menu_context or 'Menü bilgisi bulunamadı. Genel restoran bilgileriyle yanıtla.'}
+{limits_info}
 
-Kurallar:
-1. Önce menü bağlamındaki bilgileri kullan.
-2. Bilgi yoksa "Bu konuda menümüzde bilgi bulunmuyor" de.
-3. Fiyat ve ürün adlarını menü bağlamından ver; uydurma.
-4. Önceki mesajlarla tutarlı ol."""
+Müşterinin sorusu: {question}"""
 
     def get_status(self):
         return {
@@ -144,6 +407,11 @@ Kurallar:
             "chat_model": self.chat_model if self.is_available else None,
             "vision_model": self.vision_model if self.is_available else None,
             "api_key_set": bool(self.api_key),
+            "max_concurrency": _chat_lane.max_concurrency,
+            "circuit": _chat_lane.breaker.get_stats(),
+            "vision": _vision_lane.get_stats(),
+            "coalescing": _groq_inflight.get_stats(),
+            "system_prompt_cache": _restaurant_prompts.get_stats(),
         }
 
     def test_basic_functionality(self):
@@ -164,7 +432,22 @@ Kurallar:
             return {"success": False, "error": f"Basic test failed: {exc}"}
 
     def analyze_menu_image(self, image_base64, language="tr"):
-        """Analyze menu image with Groq vision model and return structured JSON."""
+        """Analyze a base64-encoded menu image (see analyze_menu_image_file)."""
+        try:
+            image_data = base64.b64decode(image_base64)
+        except ValueError as exc:
+            return {
+                "success": False,
+                "error": f"Menü görseli okunamadı: {exc}",
+                "suggestions": None,
+            }
+        return self.analyze_menu_image_file(io.BytesIO(image_data), language)
+
+    def analyze_menu_image_file(self, image_file, language="tr"):
+        """
+        Analyze a menu image (binary file object, e.g. an upload) with the
+        Groq vision model and return structured JSON.
+        """
         if not self.is_available:
             return {
                 "success": False,
@@ -188,16 +471,22 @@ Kurallar:
             )
 
         try:
-            image_data = base64.b64decode(image_base64)
-            pil_image = Image.open(io.BytesIO(image_data))
-            if pil_image.mode not in ("RGB", "L"):
-                pil_image = pil_image.convert("RGB")
-
-            buffer = io.BytesIO()
-            pil_image.save(buffer, format="JPEG")
-            b64_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
+            jpeg_data, image_metrics = prepare_menu_image(
+                image_file,
+                max_edge=Config.MENU_IMAGE_MAX_EDGE,
+                grayscale=Config.MENU_IMAGE_GRAYSCALE,
+                crop_margins=Config.MENU_IMAGE_CROP_MARGINS,
+                max_bytes=Config.MENU_IMAGE_MAX_BYTES,
+            )
+            print(
+                f"🖼️ Menu image {image_metrics['original_size']} {image_metrics['original_bytes']}B → "
+                f"{image_metrics['size']} {image_metrics['bytes']}B q{image_metrics['quality']} "
+                f"in {image_metrics['total_ms']}ms"
+            )
+            b64_image = base64.b64encode(jpeg_data).decode("utf-8")
 
-            response_text = self._chat_completion(
+            started = time.perf_counter()
+            response_text = self._vision_completion(
                 [
                     {
                         "role": "user",
@@ -212,12 +501,12 @@ Kurallar:
                         ],
                     }
                 ],
-                model=self.vision_model,
-                temperature=0.2,
-                max_tokens=4096,
             )
+            image_metrics["vision_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
-            return self._parse_menu_json_response(response_text)
+            result = self._parse_menu_json_response(response_text)
+            result["image"] = image_metrics
+            return result
 
         except Exception as exc:
             print(f"❌ Error analyzing menu image: {exc}")
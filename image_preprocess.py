@@ -0,0 +1,172 @@
+import io
+import math
+import time
+from typing import BinaryIO
+
+from PIL import Image, ImageChops, ImageOps
+
+# JPEG quality search range; below the minimum, menu text starts to smear
+MAX_QUALITY = 90
+MIN_QUALITY = 45
+# Pixels differing from the border colour by more than this count as content
+MARGIN_THRESHOLD = 24
+# Content bounding boxes are padded by this fraction of the image size
+MARGIN_PADDING = 0.02
+# Each further downscale when the minimum quality still exceeds the budget
+DOWNSCALE_STEP = 0.8
+MAX_DOWNSCALE_STEPS = 3
+
+
+def _flatten(image: Image.Image, grayscale: bool) -> Image.Image:
+    """RGB (or L) image; transparent areas become white instead of black."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+    target = "L" if grayscale else "RGB"
+    return image if image.mode == target else image.convert(target)
+
+
+def _crop_margins(image: Image.Image) -> Image.Image:
+    """
+    Crop uniform borders (table, background around the menu card), judged
+    against the top-left pixel's colour. Leaves the image alone when no
+    clear content box is found.
+    """
+    gray = image if image.mode == "L" else image.convert("L")
+    background = Image.new("L", gray.size, gray.getpixel((0, 0)))
+    mask = ImageChops.difference(gray, background).point(
+        lambda value: 255 if value > MARGIN_THRESHOLD else 0
+    )
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+
+    width, height = image.size
+    pad_x, pad_y = int(width * MARGIN_PADDING), int(height * MARGIN_PADDING)
+    left, top, right, bottom = (
+        max(bbox[0] - pad_x, 0),
+        max(bbox[1] - pad_y, 0),
+        min(bbox[2] + pad_x, width),
+        min(bbox[3] + pad_y, height),
+    )
+    # Not worth a crop (and a likely misdetection when the box is tiny)
+    area = (right - left) * (bottom - top)
+    if area > 0.95 * width * height or area < 0.1 * width * height:
+        return image
+    return image.crop((left, top, right, bottom))
+
+
+def _encode(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _encode_within(image: Image.Image, max_bytes: int) -> tuple[bytes, int, int]:
+    """
+    Highest quality whose JPEG fits in ``max_bytes`` (binary search).
+    Returns (data, quality, encodes); data is None if even MIN_QUALITY is too big.
+    """
+    encodes = 1
+    data = _encode(image, MAX_QUALITY)
+    if len(data) <= max_bytes:
+        return data, MAX_QUALITY, encodes
+
+    best, best_quality = None, None
+    low, high = MIN_QUALITY, MAX_QUALITY - 1
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = _encode(image, quality)
+        encodes += 1
+        if len(candidate) <= max_bytes:
+            best, best_quality = candidate, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best, best_quality, encodes
+
+
+def prepare_menu_image(
+    image: bytes | BinaryIO,
+    max_edge: int = 1600,
+    grayscale: bool = False,
+    crop_margins: bool = True,
+    max_bytes: int = 600_000,
+) -> tuple[bytes, dict]:
+    """
+    Turn an uploaded menu photo into a compact JPEG for the vision model.
+
+    The image is oriented by its EXIF tag, flattened, cropped to its content
+    (optional), shrunk so its longest edge is at most ``max_edge`` and
+    encoded at the highest JPEG quality that fits in ``max_bytes``.
+    JPEGs are decoded at reduced size straight from the DCT (``draft``), so
+    large phone photos are never decoded at full resolution; the draft scale
+    is chosen for the whole frame, so a heavily cropped photo can end up
+    below ``max_edge``. ``image`` is the encoded image, as bytes or a
+    seekable binary file (read in place, without copying it into memory).
+    Returns (jpeg_bytes, metrics).
+    """
+    started = time.perf_counter()
+    if isinstance(image, (bytes, bytearray)):
+        original_bytes = len(image)
+        image = io.BytesIO(image)
+    else:
+        original_bytes = image.seek(0, io.SEEK_END)
+        image.seek(0)
+    image = Image.open(image)
+    original_size = image.size
+    original_format = image.format
+    if max_edge and max(original_size) > max_edge:
+        # JPEGs decode at the smallest 1/2, 1/4 or 1/8 scale that keeps the
+        # longest edge >= max_edge (other formats ignore this)
+        scale = max_edge / max(original_size)
+        image.draft(
+            "L" if grayscale else "RGB",
+            (math.ceil(original_size[0] * scale), math.ceil(original_size[1] * scale)),
+        )
+    image = ImageOps.exif_transpose(image)
+    image = _flatten(image, grayscale)
+    decoded = time.perf_counter()
+
+    if crop_margins:
+        image = _crop_margins(image)
+    if max_edge and max(image.size) > max_edge:
+        # reducing_gap box-reduces most of the way first; bicubic keeps glyph
+        # edges crisp at a fraction of Lanczos' cost for the remaining step
+        image.thumbnail((max_edge, max_edge), Image.Resampling.BICUBIC, reducing_gap=2.0)
+    transformed = time.perf_counter()
+
+    data, quality, encodes = _encode_within(image, max_bytes)
+    steps = 0
+    while data is None and steps < MAX_DOWNSCALE_STEPS:
+        steps += 1
+        width, height = image.size
+        image = image.resize(
+            (max(int(width * DOWNSCALE_STEP), 1), max(int(height * DOWNSCALE_STEP), 1)),
+            Image.Resampling.BILINEAR,
+        )
+        data, quality, more = _encode_within(image, max_bytes)
+        encodes += more
+    if data is None:
+        # Budget unreachable: send the smallest version rather than fail
+        data, quality = _encode(image, MIN_QUALITY), MIN_QUALITY
+        encodes += 1
+    encoded = time.perf_counter()
+
+    metrics = {
+        "original_format": original_format,
+        "original_size": list(original_size),
+        "original_bytes": original_bytes,
+        "size": list(image.size),
+        "mode": image.mode,
+        "bytes": len(data),
+        "quality": quality,
+        "encodes": encodes,
+        "decode_ms": round((decoded - started) * 1000, 1),
+        "transform_ms": round((transformed - decoded) * 1000, 1),
+        "encode_ms": round((encoded - transformed) * 1000, 1),
+        "total_ms": round((encoded - started) * 1000, 1),
+    }
+    return data, metrics
@@ -0,0 +1,259 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+
+
+class IndexQueue:
+    """
+    Persistent background queue for menu reindex jobs.
+
+    Jobs live in a SQLite file (one row per restaurant), so pending work
+    survives restarts and is shared by the workers on a host. Enqueueing a
+    restaurant that is already queued is a no-op, and one enqueued while its
+    job is running schedules a single follow-up run. ``run_fn(slug, force)``
+    must return the indexer's result dict: raising is retried with
+    exponential backoff, a ``success: False`` result is final.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    def __init__(
+        self,
+        run_fn,
+        path: str,
+        workers: int = 1,
+        max_attempts: int = 5,
+        retry_delay: float = 5.0,
+        poll_interval: float = 2.0,
+        stale_after: float = 600.0,
+    ):
+        self.run_fn = run_fn
+        self.path = path
+        self.workers = max(workers, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._local = threading.local()
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_jobs ("
+            "slug TEXT PRIMARY KEY, status TEXT NOT NULL, force INTEGER NOT NULL DEFAULT 0, "
+            "rerun INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_run_at REAL NOT NULL, enqueued_at REAL NOT NULL, started_at REAL, "
+            "finished_at REAL, last_error TEXT, result TEXT)"
+        )
+        self._reclaim_stale(conn, time.time())
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM index_jobs WHERE status = ?", (self.STATUS_QUEUED,)
+        ).fetchone()[0]
+        if pending:
+            self._ensure_workers()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # Public API ------------------------------------------------------------
+
+    def enqueue(self, slug: str, force: bool = False) -> dict:
+        """Schedule a reindex of ``slug`` and return its job status."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status FROM index_jobs WHERE slug = ?", (slug,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO index_jobs (slug, status, force, next_run_at, enqueued_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (slug, self.STATUS_QUEUED, int(force), now, now),
+                )
+            elif row["status"] == self.STATUS_RUNNING:
+                # The running job may have read the menu before this write
+                conn.execute(
+                    "UPDATE index_jobs SET rerun = 1, force = MAX(force, ?) WHERE slug = ?",
+                    (int(force), slug),
+                )
+            elif row["status"] == self.STATUS_QUEUED:
+                conn.execute(
+                    "UPDATE index_jobs SET force = MAX(force, ?), next_run_at = MIN(next_run_at, ?) "
+                    "WHERE slug = ?",
+                    (int(force), now, slug),
+                )
+            else:
+                conn.execute(
+                    "UPDATE index_jobs SET status = ?, force = ?, rerun = 0, attempts = 0, "
+                    "next_run_at = ?, enqueued_at = ?, last_error = NULL WHERE slug = ?",
+                    (self.STATUS_QUEUED, int(force), now, now, slug),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._ensure_workers()
+        self._wakeup.set()
+        return self.get_job(slug)
+
+    def get_job(self, slug: str) -> dict | None:
+        row = self._connect().execute(
+            "SELECT * FROM index_jobs WHERE slug = ?", (slug,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["force"] = bool(job["force"])
+        job["rerun"] = bool(job["rerun"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get_status(self) -> dict:
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS count FROM index_jobs GROUP BY status"
+        ).fetchall()
+        return {
+            "path": self.path,
+            "workers": len(self._threads),
+            "jobs": {row["status"]: row["count"] for row in rows},
+        }
+
+    # Workers ---------------------------------------------------------------
+
+    def _ensure_workers(self) -> None:
+        if len(self._threads) >= self.workers:
+            return
+        with self._threads_lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work_loop,
+                    name=f"index-queue-{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def _work_loop(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except Exception as exc:
+                print(f"⚠️ Index queue claim failed: {exc}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._run(job)
+
+    def _reclaim_stale(self, conn: sqlite3.Connection, now: float) -> None:
+        """
+        Requeue jobs left running by a worker that died (restart, OOM kill),
+        counting it as a failed attempt so a job that keeps crashing its
+        worker ends up failed instead of looping.
+        """
+        stale_before = now - self.stale_after
+        conn.execute(
+            "UPDATE index_jobs SET status = ?, attempts = attempts + 1, next_run_at = ?, "
+            "last_error = ? WHERE status = ? AND started_at < ?",
+            (
+                self.STATUS_QUEUED,
+                now,
+                "Worker stopped while running the job",
+                self.STATUS_RUNNING,
+                stale_before,
+            ),
+        )
+        conn.execute(
+            "UPDATE index_jobs SET status = ?, finished_at = ? "
+            "WHERE status = ? AND attempts >= ? AND started_at < ?",
+            (self.STATUS_FAILED, now, self.STATUS_QUEUED, self.max_attempts, stale_before),
+        )
+
+    def _claim(self) -> dict | None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._reclaim_stale(conn, now)
+            row = conn.execute(
+                "SELECT slug, force, attempts FROM index_jobs "
+                "WHERE status = ? AND next_run_at <= ? ORDER BY next_run_at LIMIT 1",
+                (self.STATUS_QUEUED, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE index_jobs SET status = ?, rerun = 0, started_at = ? WHERE slug = ?",
+                    (self.STATUS_RUNNING, now, row["slug"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return dict(row) if row is not None else None
+
+    def _run(self, job: dict) -> None:
+        slug = job["slug"]
+        try:
+            result = self.run_fn(slug, bool(job["force"])) or {}
+            error = None
+        except Exception as exc:
+            result = None
+            error = str(exc)
+            print(f"❌ Menu reindex failed for {slug}: {exc}")
+
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rerun = conn.execute(
+                "SELECT rerun FROM index_jobs WHERE slug = ?", (slug,)
+            ).fetchone()["rerun"]
+
+            if rerun:
+                status, attempts, next_run_at = self.STATUS_QUEUED, 0, now
+            elif error is None:
+                status = self.STATUS_DONE if result.get("success") else self.STATUS_FAILED
+                attempts, next_run_at = 0, now
+                error = None if result.get("success") else result.get("error")
+            else:
+                attempts = job["attempts"] + 1
+                if attempts < self.max_attempts:
+                    delay = self.retry_delay * 2 ** (attempts - 1)
+                    status, next_run_at = self.STATUS_QUEUED, now + delay * random.uniform(0.8, 1.2)
+                else:
+                    status, next_run_at = self.STATUS_FAILED, now
+
+            conn.execute(
+                "UPDATE index_jobs SET status = ?, rerun = 0, attempts = ?, next_run_at = ?, "
+                "finished_at = ?, last_error = ?, result = ? WHERE slug = ?",
+                (
+                    status,
+                    attempts,
+                    next_run_at,
+                    now,
+                    error,
+                    json.dumps(result, ensure_ascii=False, default=str) if result else None,
+                    slug,
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception as exc:
+            conn.execute("ROLLBACK")
+            print(f"⚠️ Could not record reindex result for {slug}: {exc}")
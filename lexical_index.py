@@ -0,0 +1,132 @@
+import math
+import threading
+from collections import Counter
+
+from text_normalize import normalize_query
+
+
+def _words(text: str) -> list[str]:
+    return normalize_query(text).split()
+
+
+def _trigrams(words: list[str]) -> list[str]:
+    grams = []
+    for word in words:
+        padded = f" {word} "
+        grams.extend(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _BM25:
+    def __init__(self, docs: list[list[str]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = [len(doc) for doc in docs]
+        self.avg_length = (sum(self.doc_lengths) / len(docs)) if docs else 0.0
+        self.postings = {}
+        for doc_idx, doc in enumerate(docs):
+            for term, tf in Counter(doc).items():
+                self.postings.setdefault(term, []).append((doc_idx, tf))
+        n = len(docs)
+        self.idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def score(self, terms: list[str]) -> dict[int, float]:
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / self.avg_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+class LexicalMenuIndex:
+    """
+    BM25 over Turkish-folded words plus character trigrams of a menu's items.
+
+    Whole words reward exact dish names ("iskender"); trigrams keep partial
+    and misspelled names ("iskendr", "lahmacn") matchable.
+    """
+
+    TRIGRAM_WEIGHT = 0.5
+    # Matches scoring below this fraction of the best one are incidental
+    # (shared trigrams, stop words) and would only add noise to the fusion
+    MIN_RELATIVE_SCORE = 0.25
+
+    def __init__(self, docs: list[dict]):
+        """``docs`` are item records with at least "id" and "text"."""
+        self.docs = docs
+        words = [_words(doc["text"]) for doc in docs]
+        self._words = _BM25(words)
+        self._trigrams = _BM25([_trigrams(w) for w in words])
+
+    def search(self, query: str, top_k: int) -> list[tuple[dict, float]]:
+        words = _words(query)
+        if not words or not self.docs:
+            return []
+
+        scores = self._words.score(words)
+        for doc_idx, score in self._trigrams.score(_trigrams(words)).items():
+            scores[doc_idx] = scores.get(doc_idx, 0.0) + self.TRIGRAM_WEIGHT * score
+
+        if not scores:
+            return []
+        cutoff = max(scores.values()) * self.MIN_RELATIVE_SCORE
+        ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:top_k]
+        return [(self.docs[doc_idx], score) for doc_idx, score in ranked if score > cutoff]
+
+
+class MenuIndexCache:
+    """
+    Per-process indexes derived from a restaurant's menu items, keyed by
+    restaurant and rebuilt when the menu content hash changes.
+    ``index_factory(docs)`` builds the index (e.g. LexicalMenuIndex).
+    """
+
+    def __init__(self, index_factory=LexicalMenuIndex):
+        self.index_factory = index_factory
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, restaurant_slug: str):
+        with self._lock:
+            entry = self._indexes.get(restaurant_slug)
+        return entry[1] if entry else None
+
+    def ensure(self, restaurant_slug: str, content_hash: str, build_docs):
+        """Return the index for ``content_hash``, building it from ``build_docs()`` if stale."""
+        with self._lock:
+            entry = self._indexes.get(restaurant_slug)
+        if entry and entry[0] == content_hash:
+            return entry[1]
+
+        index = self.index_factory(build_docs())
+        with self._lock:
+            self._indexes[restaurant_slug] = (content_hash, index)
+        return index
+
+    def forget(self, restaurant_slug: str) -> None:
+        with self._lock:
+            self._indexes.pop(restaurant_slug, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "restaurants": len(self._indexes),
+                "documents": sum(len(index.docs) for _, index in self._indexes.values()),
+            }
+
+
+def reciprocal_rank_fusion(ranked_lists: list[list[str]], k: int = 60) -> dict[str, float]:
+    """Fuse ranked id lists: each id scores sum(1 / (k + rank))."""
+    fused = {}
+    for ranked in ranked_lists:
+        for rank, doc_id in enumerate(ranked, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
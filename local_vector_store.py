@@ -0,0 +1,323 @@
+import json
+import os
+import threading
+from typing import Any
+
+import numpy as np
+from pinecone import Pinecone
+
+from config import Config
+from menu_filters import matches_filters
+from menu_vector_store import (
+    MenuVectorStore,
+    _item_doc,
+    _menu_item_records,
+    embed_limiter,
+    menu_content_hash,
+)
+
+# Indexed namespaces are shared by every store in the process, like the index
+# registry, so a reindex done by one service instance is visible to the others
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+class LocalMenuVectorStore(MenuVectorStore):
+    """
+    In-process menu vector index with brute-force cosine search.
+
+    Menus are small (tens to a few hundred items), so each restaurant is a
+    float32 matrix of unit-normalized rows and a search is one matrix-vector
+    product. Embeddings still come from Pinecone inference unless an
+    ``embed_fn(texts, input_type)`` is given (e.g. for offline tests).
+
+    Without LOCAL_VECTOR_DIR every worker process holds its own copy, so a
+    search checks the menu's content hash and reindexes (only the changed
+    items) when another worker has seen a newer menu. With it set, each
+    index is saved as a single .npz file that all workers on the host load.
+    """
+
+    def __init__(self, embed_fn=None, data_dir: str | None = None):
+        self.embed_fn = embed_fn
+        self.data_dir = data_dir if data_dir is not None else Config.LOCAL_VECTOR_DIR
+        super().__init__()
+        self.index_name = None
+
+    def _connect(self) -> None:
+        if self.data_dir:
+            os.makedirs(self.data_dir, exist_ok=True)
+
+        if self.embed_fn is not None:
+            self.is_available = True
+            return
+
+        if not self.api_key:
+            print("⚠️ PINECONE_API_KEY not provided. Local menu vector search disabled.")
+            return
+
+        try:
+            self.pc = Pinecone(api_key=self.api_key)
+            self.is_available = True
+            print("✅ Local menu vector index ready (Pinecone inference for embeddings)")
+        except Exception as exc:
+            print(f"❌ Failed to initialize Pinecone inference: {exc}")
+
+    def _embed_batch(self, texts: list[str], input_type: str) -> list[list[float]]:
+        if self.embed_fn is not None:
+            return embed_limiter.call(self.embed_fn, texts, input_type)
+        return super()._embed_batch(texts, input_type)
+
+    # Storage ---------------------------------------------------------------
+
+    def _path(self, namespace: str) -> str:
+        return os.path.join(self.data_dir, f"{namespace}.npz")
+
+    def _save(self, namespace: str, entry: dict) -> int:
+        """Write the index as one file; returns its mtime (ns)."""
+        path = self._path(namespace)
+        meta = json.dumps(
+            {
+                "content_hash": entry["content_hash"],
+                "keys": entry["keys"],
+                "item_hashes": entry["item_hashes"],
+                "items": entry["items"],
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        # Matrix and metadata live in one file that is renamed into place, so
+        # a reader sees either the old index or the new one, never a mix
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            np.savez(fh, matrix=entry["matrix"], meta=np.frombuffer(meta, dtype=np.uint8))
+        os.replace(tmp_path, path)
+        return os.stat(path).st_mtime_ns
+
+    def _load(self, namespace: str) -> dict | None:
+        """Return the namespace entry, (re)loading it from disk if it changed."""
+        with _namespaces_lock:
+            entry = _namespaces.get(namespace)
+        if not self.data_dir:
+            return entry
+
+        try:
+            mtime = os.stat(self._path(namespace)).st_mtime_ns
+        except OSError:
+            return entry
+        if entry is not None and entry.get("mtime", 0) >= mtime:
+            return entry
+
+        try:
+            with open(self._path(namespace), "rb") as fh:
+                # The mtime of the file actually opened, in case it was just replaced
+                mtime = os.fstat(fh.fileno()).st_mtime_ns
+                with np.load(fh, allow_pickle=False) as data:
+                    matrix = data["matrix"]
+                    meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            entry = {
+                "content_hash": meta["content_hash"],
+                "keys": meta.get("keys", []),
+                "item_hashes": meta.get("item_hashes", []),
+                "items": meta["items"],
+                "matrix": matrix,
+                "mtime": mtime,
+            }
+        except Exception as exc:
+            print(f"⚠️ Could not load local index {namespace}: {exc}")
+            return entry
+
+        with _namespaces_lock:
+            _namespaces[namespace] = entry
+        return entry
+
+    # MenuVectorStore interface ---------------------------------------------
+
+    def index_restaurant_menu(
+        self,
+        restaurant_slug: str,
+        menu_data: dict,
+        force: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Bring a restaurant's index in line with its menu, embedding only the
+        items that are new or changed; rows of unchanged items are reused.
+        """
+        if not self.is_available:
+            return {
+                "success": False,
+                "error": "Vektör servisi kullanılamıyor. PINECONE_API_KEY ayarlayın.",
+            }
+
+        records = _menu_item_records(menu_data, self.embed_model)
+        if not records:
+            return {"success": False, "error": "İndekslenecek menü öğesi bulunamadı."}
+
+        namespace = self._namespace(restaurant_slug)
+        content_hash = menu_content_hash(menu_data)
+        current = self._load(namespace)
+        self.update_item_indexes(restaurant_slug, menu_data)
+
+        if force:
+            self.registry.forget(restaurant_slug)
+        elif current and current["content_hash"] == content_hash:
+            self.registry.record(restaurant_slug, content_hash, len(records))
+            return {
+                "success": True,
+                "indexed": 0,
+                "skipped": True,
+                "message": "Menü zaten güncel.",
+            }
+
+        stored_rows = {}
+        if current:
+            for row, (key, item_hash) in enumerate(
+                zip(current.get("keys", []), current.get("item_hashes", []))
+            ):
+                stored_rows[key] = (row, item_hash)
+
+        changed = [
+            r for r in records if stored_rows.get(r["key"], (None, None))[1] != r["item_hash"]
+        ]
+        embeddings = (
+            self._embed([r["text"] for r in changed], input_type="passage") if changed else []
+        )
+        new_vectors = dict(zip((r["key"] for r in changed), embeddings))
+
+        # Every item unchanged means there is a current matrix to take the width from
+        dimension = len(embeddings[0]) if embeddings else current["matrix"].shape[1]
+        matrix = np.empty((len(records), dimension), dtype=np.float32)
+        for row, record in enumerate(records):
+            if record["key"] in new_vectors:
+                matrix[row] = new_vectors[record["key"]]
+            else:
+                matrix[row] = current["matrix"][stored_rows[record["key"]][0]]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+
+        current_keys = {r["key"] for r in records}
+        entry = {
+            "content_hash": content_hash,
+            "matrix": matrix,
+            "keys": [r["key"] for r in records],
+            "item_hashes": [r["item_hash"] for r in records],
+            "items": [
+                {key: value for key, value in _item_doc(r).items() if key != "id"}
+                for r in records
+            ],
+        }
+        if self.data_dir:
+            entry["mtime"] = self._save(namespace, entry)
+        with _namespaces_lock:
+            _namespaces[namespace] = entry
+
+        self.registry.record(restaurant_slug, content_hash, len(records))
+        return {
+            "success": True,
+            "indexed": len(changed),
+            "added": sum(1 for r in changed if r["key"] not in stored_rows),
+            "removed": sum(1 for key in stored_rows if key not in current_keys),
+            "unchanged": len(records) - len(changed),
+            "namespace": namespace,
+            "skipped": False,
+        }
+
+    def search_menu(
+        self,
+        restaurant_slug: str,
+        query: str,
+        top_k: int | None = None,
+        query_embedding: list[float] | None = None,
+        menu_data: dict | None = None,
+        filters: dict | None = None,
+    ) -> list[dict]:
+        """
+        MenuVectorStore.search_menu, after bringing the local index up to
+        date with ``menu_data`` when its content hash differs (the menu was
+        changed through another worker).
+        """
+        if menu_data and self.is_available:
+            entry = self._load(self._namespace(restaurant_slug))
+            if entry is None or entry["content_hash"] != menu_content_hash(menu_data):
+                self.index_restaurant_menu(restaurant_slug, menu_data)
+        return super().search_menu(
+            restaurant_slug,
+            query,
+            top_k=top_k,
+            query_embedding=query_embedding,
+            menu_data=menu_data,
+            filters=filters,
+        )
+
+    def _vector_search(
+        self,
+        restaurant_slug: str,
+        query_embedding,
+        top_k: int,
+        filters: dict | None = None,
+    ) -> list[dict]:
+        """Cosine top-k over the restaurant's in-memory item matrix."""
+        entry = self._load(self._namespace(restaurant_slug))
+        if entry is None or not len(entry["items"]):
+            return []
+
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+
+        scores = entry["matrix"] @ vector
+        if filters:
+            allowed = np.array([matches_filters(item, filters) for item in entry["items"]])
+            if not allowed.any():
+                return []
+            scores = np.where(allowed, scores, -np.inf)
+            top_k = min(top_k, int(allowed.sum()))
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        keys = entry.get("keys") or []
+        return [
+            {
+                "id": keys[i] if i < len(keys) else str(i),
+                "score": float(scores[i]),
+                **entry["items"][i],
+            }
+            for i in top
+        ]
+
+    def delete_restaurant_index(self, restaurant_slug: str) -> bool:
+        namespace = self._namespace(restaurant_slug)
+        self.registry.forget(restaurant_slug)
+        self.lexical.forget(restaurant_slug)
+        self.attributes.forget(restaurant_slug)
+        with _namespaces_lock:
+            _namespaces.pop(namespace, None)
+        if self.data_dir:
+            try:
+                os.remove(self._path(namespace))
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                print(f"Local index delete error: {exc}")
+                return False
+        return True
+
+    def get_status(self) -> dict:
+        with _namespaces_lock:
+            loaded = len(_namespaces)
+            vectors = sum(len(entry["items"]) for entry in _namespaces.values())
+        return {
+            "available": self.is_available,
+            "backend": "local",
+            "embed_model": self.embed_model if self.is_available else None,
+            "api_key_set": bool(self.api_key),
+            "data_dir": self.data_dir or None,
+            "namespaces_loaded": loaded,
+            "vectors_loaded": vectors,
+            "index_registry": self.registry.get_stats(),
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "embed_limiter": embed_limiter.get_stats(),
+            "hybrid_search": self.hybrid_search,
+            "lexical_index": self.lexical.get_stats(),
+            "attribute_index": self.attributes.get_stats(),
+        }
@@ -0,0 +1,277 @@
+import bisect
+import re
+
+from text_normalize import fold_turkish, normalize_query
+
+# Canonical allergen → folded spellings seen in menus and questions
+ALLERGEN_ALIASES = {
+    "gluten": {"gluten", "bugday", "wheat"},
+    "sut": {"sut", "laktoz", "milk", "dairy", "lactose"},
+    "yumurta": {"yumurta", "egg", "eggs"},
+    "fistik": {"fistik", "yer fistigi", "peanut", "peanuts"},
+    "findik": {"findik", "hazelnut", "hazelnuts"},
+    "ceviz": {"ceviz", "walnut", "walnuts", "kuruyemis", "nuts"},
+    "susam": {"susam", "sesame", "sesam"},
+    "soya": {"soya", "soy"},
+    "balik": {"balik", "fish"},
+    "kabuklu": {"kabuklu", "kabuklu deniz urunleri", "karides", "shellfish", "shrimp"},
+    "hardal": {"hardal", "mustard"},
+    "kereviz": {"kereviz", "celery"},
+}
+_ALLERGEN_BY_ALIAS = {
+    alias: canonical for canonical, aliases in ALLERGEN_ALIASES.items() for alias in aliases
+}
+# How canonical allergens are written in answers
+ALLERGEN_DISPLAY_NAMES = {
+    "gluten": "gluten",
+    "sut": "süt",
+    "yumurta": "yumurta",
+    "fistik": "yer fıstığı",
+    "findik": "fındık",
+    "ceviz": "ceviz/kuruyemiş",
+    "susam": "susam",
+    "soya": "soya",
+    "balik": "balık",
+    "kabuklu": "kabuklu deniz ürünleri",
+    "hardal": "hardal",
+    "kereviz": "kereviz",
+}
+
+# Folded spice labels → level on a 0 (not spicy) .. 4 (very hot) scale
+SPICE_LEVELS = {
+    "0": 0, "none": 0, "yok": 0, "acisiz": 0, "sweet": 0, "tatli": 0,
+    "1": 1, "mild": 1, "hafif": 1, "az": 1, "az acili": 1,
+    "2": 2, "medium": 2, "orta": 2, "orta acili": 2,
+    "3": 3, "hot": 3, "spicy": 3, "aci": 3, "acili": 3,
+    "4": 4, "very hot": 4, "extra hot": 4, "cok aci": 4, "cok acili": 4,
+}
+
+# Words that carry no meaning beyond the filter itself ("glutensiz neler var?")
+_GENERIC_WORDS = {
+    "ne", "neler", "nedir", "var", "mi", "mu", "hangi", "hangileri", "olan", "olanlar",
+    "urun", "urunler", "urunleri", "yemek", "yemekler", "yemekleri", "bir", "sey",
+    "seyler", "menude", "menu", "listele", "goster", "oner", "onerir", "onerirsin",
+    "misin", "musun", "lutfen", "bana", "icin", "tl", "lira", "fiyat", "fiyati",
+    "fiyatli", "ve", "veya", "ile", "en", "hepsi", "tum", "butun", "istiyorum", "olarak",
+}
+
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+_CURRENCY = r"\s*(?:tl|try|lira|₺)?(?:nin|den|dan|ten|tan|ye|ya|lik)?"
+_PRICE_RANGE = re.compile(_NUMBER + _CURRENCY + r"\s*(?:-|ile|ila)\s*" + _NUMBER + _CURRENCY + r"\s*(?:arasi|arasinda)")
+_PRICE_MAX_PREFIX = re.compile(r"(?:en fazla|en cok|maksimum|max)\s*" + _NUMBER + _CURRENCY)
+_PRICE_MIN_PREFIX = re.compile(r"(?:en az|minimum|min)\s*" + _NUMBER + _CURRENCY)
+_PRICE_MAX = re.compile(_NUMBER + _CURRENCY + r"\s+(?:alti|altinda|altindaki|asagi|asagisi|az|ucuz|kadar)\b")
+_PRICE_MIN = re.compile(_NUMBER + _CURRENCY + r"\s+(?:ustu|uzeri|ustunde|uzerinde|fazla|pahali)\b")
+
+_SPICE_NONE = re.compile(r"\b(?:acisiz|aci olmayan|acisi olmayan|aci olmasin|acisi yok|not spicy)\b")
+_SPICE_LOW = re.compile(r"\b(?:az acili|hafif acili|az aci)\b")
+_SPICE_HIGH = re.compile(r"\b(?:cok acili|cok aci|ekstra acili)\b")
+_SPICE_ANY = re.compile(r"\b(?:acili|baharatli|spicy)\b")
+
+_ALLERGEN_FREE = re.compile(r"\b(\w+?)(?:siz|suz)\b")
+_ALLERGEN_WITHOUT = re.compile(r"\b([\w ]+?)\s+(icermeyen|icermez|olmayan|yok)\b")
+
+
+def parse_price(value) -> float | None:
+    """Numeric price from values like 250, "250 TL", "₺1.250,50"."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"\d[\d.,]*", str(value or ""))
+    if not match:
+        return None
+    number = match.group(0).rstrip(".,")
+    if "," in number:
+        # Turkish format: "." groups thousands, "," separates decimals
+        number = number.replace(".", "").replace(",", ".")
+    elif number.count(".") > 1 or re.search(r"\.\d{3}$", number):
+        number = number.replace(".", "")
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def canonical_allergens(values) -> list[str]:
+    """Map a menu item's allergen labels to canonical folded names."""
+    if isinstance(values, str):
+        values = re.split(r"[,;/]", values)
+    result = set()
+    for value in values or []:
+        folded = " ".join(fold_turkish(str(value)).split())
+        if folded:
+            result.add(_ALLERGEN_BY_ALIAS.get(folded, folded))
+    return sorted(result)
+
+
+def parse_spice_level(value) -> int | None:
+    if isinstance(value, (int, float)):
+        return max(0, min(int(value), 4))
+    folded = " ".join(fold_turkish(str(value or "")).split())
+    if not folded:
+        return None
+    return SPICE_LEVELS.get(folded)
+
+
+def parse_menu_query(question: str) -> tuple[dict, list[str]]:
+    """
+    Extract structured constraints from a chat question.
+
+    Returns (filters, residual_words). ``filters`` may contain min_price,
+    max_price, max_spice, min_spice and exclude_allergens; residual_words
+    are the question words not consumed by a filter, used to tell a pure
+    filter question ("20 TL altı glutensiz neler var") from one that still
+    needs retrieval.
+    """
+    text = fold_turkish(question).replace("'", "").replace("’", "")
+    filters = {}
+    consumed = []
+
+    def take(pattern):
+        match = pattern.search(text)
+        if match:
+            consumed.append(match.group(0))
+        return match
+
+    if match := take(_PRICE_RANGE):
+        low, high = parse_price(match.group(1)), parse_price(match.group(2))
+        filters["min_price"], filters["max_price"] = min(low, high), max(low, high)
+    else:
+        if match := take(_PRICE_MAX_PREFIX) or take(_PRICE_MAX):
+            filters["max_price"] = parse_price(match.group(1))
+        if match := take(_PRICE_MIN_PREFIX) or take(_PRICE_MIN):
+            filters["min_price"] = parse_price(match.group(1))
+
+    if take(_SPICE_NONE):
+        # "Mild" is the default label on most menus, so it counts as not spicy
+        filters["max_spice"] = 1
+    elif take(_SPICE_LOW):
+        filters["max_spice"] = 2
+    elif take(_SPICE_HIGH):
+        filters["min_spice"] = 4
+    elif take(_SPICE_ANY):
+        filters["min_spice"] = 3
+
+    excluded = set()
+    for match in _ALLERGEN_FREE.finditer(text):
+        canonical = _ALLERGEN_BY_ALIAS.get(match.group(1))
+        if canonical:
+            excluded.add(canonical)
+            consumed.append(match.group(0))
+    for match in _ALLERGEN_WITHOUT.finditer(text):
+        words = match.group(1).split()
+        # Try the longest trailing phrase first ("yer fistigi olmayan")
+        for start in range(len(words)):
+            phrase = " ".join(words[start:])
+            canonical = _ALLERGEN_BY_ALIAS.get(phrase)
+            if canonical:
+                excluded.add(canonical)
+                consumed.append(f"{phrase} {match.group(2)}")
+                break
+    if "gluten free" in text:
+        excluded.add("gluten")
+        consumed.append("gluten free")
+    if excluded:
+        filters["exclude_allergens"] = sorted(excluded)
+
+    residual = text
+    for span in consumed:
+        residual = residual.replace(span, " ")
+    residual_words = [
+        word for word in normalize_query(residual).split()
+        if word not in _GENERIC_WORDS and not word.isdigit()
+    ]
+    return filters, residual_words
+
+
+def matches_filters(doc: dict, filters: dict) -> bool:
+    price = doc.get("price_value")
+    if "max_price" in filters and (price is None or price > filters["max_price"]):
+        return False
+    if "min_price" in filters and (price is None or price < filters["min_price"]):
+        return False
+
+    spice = doc.get("spice_value")
+    if "max_spice" in filters and spice is not None and spice > filters["max_spice"]:
+        return False
+    if "min_spice" in filters and (spice is None or spice < filters["min_spice"]):
+        return False
+
+    excluded = filters.get("exclude_allergens")
+    if excluded and set(doc.get("allergen_tags") or []) & set(excluded):
+        return False
+    return True
+
+
+def lacks_filter_data(doc: dict, filters: dict) -> bool:
+    """
+    True if ``doc`` only passes the spice or allergen exclusions in
+    ``filters`` because the data they check is missing (no spice level, no
+    allergens listed). Such items can't be called safe outright.
+    """
+    if "max_spice" in filters and doc.get("spice_value") is None:
+        return True
+    if filters.get("exclude_allergens") and not doc.get("allergen_tags"):
+        return True
+    return False
+
+
+def pinecone_filter(filters: dict) -> dict:
+    """Pinecone metadata filter equivalent of ``filters`` for menu items."""
+    clauses = [{"type": {"$eq": "menu_item"}}]
+    if "max_price" in filters:
+        clauses.append({"price_value": {"$lte": filters["max_price"]}})
+    if "min_price" in filters:
+        clauses.append({"price_value": {"$gte": filters["min_price"]}})
+    if "max_spice" in filters:
+        # Unknown spice is stored as -1 so it passes an upper bound, as in matches_filters
+        clauses.append({"spice_value": {"$lte": filters["max_spice"]}})
+    if "min_spice" in filters:
+        clauses.append({"spice_value": {"$gte": filters["min_spice"]}})
+    if filters.get("exclude_allergens"):
+        clauses.append({"allergen_tags": {"$nin": list(filters["exclude_allergens"])}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def describe_filters(filters: dict) -> str:
+    """Short Turkish description, e.g. "20 TL altı, glutensiz"."""
+    parts = []
+    if "min_price" in filters and "max_price" in filters:
+        parts.append(f"{filters['min_price']:g}-{filters['max_price']:g} TL arası")
+    elif "max_price" in filters:
+        parts.append(f"{filters['max_price']:g} TL altı")
+    elif "min_price" in filters:
+        parts.append(f"{filters['min_price']:g} TL üstü")
+    if "max_spice" in filters:
+        parts.append("acısız" if filters["max_spice"] <= 1 else "az acılı")
+    if "min_spice" in filters:
+        parts.append("çok acılı" if filters["min_spice"] >= 4 else "acılı")
+    for allergen in filters.get("exclude_allergens") or []:
+        parts.append(f"{ALLERGEN_DISPLAY_NAMES.get(allergen, allergen)} içermeyen")
+    return ", ".join(parts)
+
+
+class AttributeIndex:
+    """
+    Structured attributes of a restaurant's items for filter-first lookups.
+
+    Items are kept sorted by price so price bounds are a bisect; allergen and
+    spice constraints are checked on that (usually much smaller) slice.
+    """
+
+    def __init__(self, docs: list[dict]):
+        self.docs = docs
+        priced = sorted(
+            (doc["price_value"], idx) for idx, doc in enumerate(docs)
+            if doc.get("price_value") is not None
+        )
+        self._prices = [price for price, _ in priced]
+        self._by_price = [idx for _, idx in priced]
+
+    def filter(self, filters: dict) -> list[dict]:
+        if "min_price" in filters or "max_price" in filters:
+            lo = bisect.bisect_left(self._prices, filters.get("min_price", float("-inf")))
+            hi = bisect.bisect_right(self._prices, filters.get("max_price", float("inf")))
+            candidates = [self.docs[idx] for idx in self._by_price[lo:hi]]
+        else:
+            candidates = self.docs
+        return [doc for doc in candidates if matches_filters(doc, filters)]
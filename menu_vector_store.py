@@ -1,10 +1,27 @@
 import hashlib
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 from pinecone import Pinecone, ServerlessSpec
 
 from config import Config
+from embedding_cache import EmbeddingCache
+from lexical_index import MenuIndexCache, reciprocal_rank_fusion
+from rate_limit import AdaptiveConcurrencyLimiter
+from menu_filters import (
+    AttributeIndex,
+    canonical_allergens,
+    parse_price,
+    parse_spice_level,
+    pinecone_filter,
+)
+from prompt_budget import truncate_to_tokens
+
+# Bump when item metadata changes so the next reindex rewrites every item
+ITEM_SCHEMA_VERSION = 2
 
 
 def _normalize_menu_items(categories: list) -> list[dict]:
@@ -45,6 +62,129 @@ def _item_to_text(item: dict, menu_name: str = "") -> str:
     return " | ".join(p for p in parts if p)
 
 
+def _menu_item_records(menu_data: dict, embed_model: str = "") -> list[dict]:
+    """
+    Items with a stable key and a content hash for incremental indexing.
+
+    The key depends only on category + name, so inserting or reordering items
+    does not change other items' ids; the hash covers the embedded text (and
+    the model and metadata schema), so any edit that affects the stored
+    vector marks the item changed. Price, spice level and allergens are also
+    parsed into filterable attributes.
+    """
+    records = []
+    seen = {}
+    menu_name = menu_data.get("name", "")
+    for item in _normalize_menu_items(menu_data.get("categories") or []):
+        identity = f"{item.get('category', '')}\0{item.get('name', '')}"
+        key = hashlib.sha1(identity.encode("utf-8")).hexdigest()[:16]
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > 1:
+            key = f"{key}-{seen[key]}"
+
+        text = _item_to_text(item, menu_name)
+        fingerprint = f"{ITEM_SCHEMA_VERSION}\0{embed_model}\0{text}"
+        records.append(
+            {
+                "key": key,
+                "item": item,
+                "text": text,
+                "item_hash": hashlib.md5(fingerprint.encode("utf-8")).hexdigest(),
+                "attributes": {
+                    "price_value": parse_price(item.get("price")),
+                    "spice_value": parse_spice_level(item.get("spice_level")),
+                    "allergen_tags": canonical_allergens(item.get("allergens")),
+                },
+            }
+        )
+    return records
+
+
+def _item_doc(record: dict) -> dict:
+    """Search result shape of an item record (as returned by search_menu)."""
+    item = record["item"]
+    return {
+        "id": record["key"],
+        "category": item.get("category", ""),
+        "name": item.get("name", ""),
+        "price": str(item.get("price", "")),
+        "description": item.get("description", ""),
+        "text": record["text"],
+        **record["attributes"],
+    }
+
+
+def menu_content_hash(menu_data: dict) -> str:
+    """Fingerprint of a menu's indexable content (name + categories)."""
+    menu_data = menu_data or {}
+    payload = str(menu_data.get("categories", [])) + str(menu_data.get("name", ""))
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+class MenuIndexRegistry:
+    """
+    Process-local record of restaurant slug → (content hash, indexed_at).
+
+    Lets the chat path skip the freshness probe for menus this process has
+    already seen indexed. Entries are refreshed by menu writes (forced
+    reindex) and expire after ``recheck_interval`` seconds as a safety net
+    for menus changed outside the app; 0 keeps them until forgotten.
+    """
+
+    def __init__(self, recheck_interval: float = 0):
+        self.recheck_interval = recheck_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, restaurant_slug: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(restaurant_slug)
+            if entry is None:
+                return None
+            if (
+                self.recheck_interval
+                and time.time() - entry["indexed_at"] > self.recheck_interval
+            ):
+                del self._entries[restaurant_slug]
+                return None
+            return dict(entry)
+
+    def record(self, restaurant_slug: str, content_hash: str, item_count: int = 0) -> None:
+        with self._lock:
+            self._entries[restaurant_slug] = {
+                "content_hash": content_hash,
+                "item_count": item_count,
+                "indexed_at": time.time(),
+            }
+
+    def forget(self, restaurant_slug: str | None = None) -> None:
+        with self._lock:
+            if restaurant_slug is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(restaurant_slug, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "restaurants": len(self._entries),
+                "recheck_interval_seconds": self.recheck_interval,
+            }
+
+
+# Shared by every store in the process so a reindex triggered by a menu write
+# is seen by the chat path even if it runs through another service instance
+index_registry = MenuIndexRegistry(recheck_interval=Config.MENU_INDEX_RECHECK_INTERVAL)
+lexical_indexes = MenuIndexCache()
+attribute_indexes = MenuIndexCache(AttributeIndex)
+
+# Embedding batches and index writes run on shared pools; the limiter caps
+# concurrent embed calls process-wide and backs off on rate limit errors
+embed_limiter = AdaptiveConcurrencyLimiter(Config.EMBED_CONCURRENCY)
+_embed_pool = ThreadPoolExecutor(max_workers=Config.EMBED_CONCURRENCY, thread_name_prefix="embed")
+_write_pool = ThreadPoolExecutor(max_workers=Config.UPSERT_CONCURRENCY, thread_name_prefix="index-write")
+
+
 class MenuVectorStore:
     """Pinecone-backed vector store for restaurant menu semantic search."""
 
@@ -56,10 +196,24 @@ class MenuVectorStore:
         self.embed_model = Config.PINECONE_EMBED_MODEL
         self.dimension = Config.PINECONE_EMBED_DIMENSION
         self.top_k = Config.RAG_TOP_K
+        self.embed_batch_size = Config.EMBED_BATCH_SIZE
+        self.registry = index_registry
+        self.lexical = lexical_indexes
+        self.attributes = attribute_indexes
+        self.hybrid_search = Config.HYBRID_SEARCH_ENABLED
+        self.rrf_k = Config.HYBRID_RRF_K
+        self.embedding_cache = EmbeddingCache(
+            max_size=Config.EMBEDDING_CACHE_MAX_SIZE,
+            sqlite_path=Config.EMBEDDING_CACHE_SQLITE_PATH,
+            max_disk_entries=Config.EMBEDDING_CACHE_MAX_DISK_ENTRIES,
+        )
         self.pc = None
         self.index = None
         self.is_available = False
+        self._connect()
 
+    def _connect(self) -> None:
+        """Set up the Pinecone client and index; sets is_available on success."""
         if not self.api_key:
             print("⚠️ PINECONE_API_KEY not provided. Menu vector search disabled.")
             return
@@ -94,7 +248,18 @@ class MenuVectorStore:
         return f"{self.NAMESPACE_PREFIX}-{safe}"
 
     def _embed(self, texts: list[str], input_type: str) -> list[list[float]]:
-        result = self.pc.inference.embed(
+        """Embed texts in provider-sized batches, several batches at a time."""
+        size = max(self.embed_batch_size, 1)
+        batches = [texts[i : i + size] for i in range(0, len(texts), size)]
+        if len(batches) <= 1:
+            return self._embed_batch(texts, input_type) if texts else []
+
+        results = _embed_pool.map(lambda batch: self._embed_batch(batch, input_type), batches)
+        return [vector for batch in results for vector in batch]
+
+    def _embed_batch(self, texts: list[str], input_type: str) -> list[list[float]]:
+        result = embed_limiter.call(
+            self.pc.inference.embed,
             model=self.embed_model,
             inputs=texts,
             parameters={"input_type": input_type, "truncate": "END"},
@@ -106,8 +271,129 @@ class MenuVectorStore:
         return vectors
 
     def _menu_content_hash(self, menu_data: dict) -> str:
-        payload = str(menu_data.get("categories", [])) + str(menu_data.get("name", ""))
-        return hashlib.md5(payload.encode("utf-8")).hexdigest()
+        return menu_content_hash(menu_data)
+
+    def is_indexed(self, restaurant_slug: str, content_hash: str | None = None) -> bool:
+        """
+        True if this process has recently seen the restaurant's menu indexed,
+        and, when ``content_hash`` is given, indexed at that content.
+        """
+        entry = self.registry.get(restaurant_slug)
+        if entry is None:
+            return False
+        return content_hash is None or entry["content_hash"] == content_hash
+
+    def embed_query(self, query: str) -> list[float] | None:
+        """Embed a search query, or None if embedding is unavailable/failed."""
+        if not self.is_available or not query.strip():
+            return None
+        try:
+            return self._embed_query(query)
+        except Exception as exc:
+            print(f"Pinecone embed error: {exc}")
+            return None
+
+    def _embed_query(self, query: str) -> list[float]:
+        """Embed a query, serving repeated questions from the embedding cache."""
+        key = EmbeddingCache.make_key(self.embed_model, "query", query)
+        vector = self.embedding_cache.get(key)
+        if vector is None:
+            vector = self._embed([query], input_type="query")[0]
+            self.embedding_cache.set(key, vector)
+        return vector
+
+    def update_item_indexes(self, restaurant_slug: str, menu_data: dict) -> None:
+        """Rebuild the restaurant's attribute (and lexical) index if its menu changed."""
+        if not menu_data:
+            return
+
+        content_hash = menu_content_hash(menu_data)
+        build_docs = self._docs_builder(menu_data)
+        self.attributes.ensure(restaurant_slug, content_hash, build_docs)
+        if self.hybrid_search:
+            self.lexical.ensure(restaurant_slug, content_hash, build_docs)
+
+    def _docs_builder(self, menu_data: dict):
+        """``build_docs`` callback for the item indexes; builds the docs at most once."""
+        docs = []
+
+        def build_docs():
+            if not docs:
+                docs.extend(
+                    _item_doc(record)
+                    for record in _menu_item_records(menu_data, self.embed_model)
+                )
+            return docs
+
+        return build_docs
+
+    def rank_menu_items(
+        self,
+        restaurant_slug: str,
+        query: str,
+        menu_data: dict,
+        filters: dict | None = None,
+    ) -> list[dict]:
+        """
+        Every item of ``menu_data`` (matching ``filters``): lexical matches
+        for ``query`` first, then the rest in menu order. Runs entirely in
+        process, so it also works when Pinecone is unavailable.
+        """
+        if not menu_data:
+            return []
+        content_hash = menu_content_hash(menu_data)
+        build_docs = self._docs_builder(menu_data)
+        attributes = self.attributes.ensure(restaurant_slug, content_hash, build_docs)
+        lexical = self.lexical.ensure(restaurant_slug, content_hash, build_docs)
+
+        docs = attributes.filter(filters) if filters else attributes.docs
+        allowed_ids = {doc["id"] for doc in docs}
+        ranked = [
+            doc for doc, _ in lexical.search(query, len(docs)) if doc["id"] in allowed_ids
+        ]
+        ranked_ids = {doc["id"] for doc in ranked}
+        return ranked + [doc for doc in docs if doc["id"] not in ranked_ids]
+
+    def filter_menu_items(
+        self,
+        restaurant_slug: str,
+        filters: dict,
+        menu_data: dict | None = None,
+    ) -> list[dict] | None:
+        """
+        All items matching structured ``filters``, straight from the attribute
+        index; None if the restaurant's items are not indexed in this process.
+        """
+        if menu_data:
+            self.update_item_indexes(restaurant_slug, menu_data)
+        attributes = self.attributes.get(restaurant_slug)
+        if attributes is None:
+            return None
+        return attributes.filter(filters)
+
+    def _item_id(self, restaurant_slug: str, key: str) -> str:
+        return f"{restaurant_slug}__{key}"
+
+    def _meta_id(self, restaurant_slug: str) -> str:
+        return f"{restaurant_slug}__meta"
+
+    def _stored_item_hashes(self, restaurant_slug: str, namespace: str) -> dict[str, str | None]:
+        """Map of vector id → item_hash for the items currently in the index."""
+        meta_id = self._meta_id(restaurant_slug)
+        ids = []
+        for page in self.index.list(prefix=f"{restaurant_slug}__", namespace=namespace):
+            ids.extend(vector_id for vector_id in page if vector_id != meta_id)
+
+        hashes = {}
+        fetch_size = 100
+        for i in range(0, len(ids), fetch_size):
+            fetched = self.index.fetch(ids=ids[i : i + fetch_size], namespace=namespace)
+            for vector_id, vector in (fetched.vectors or {}).items():
+                hashes[vector_id] = (vector.metadata or {}).get("item_hash")
+        # Ids listed but not fetched still have to be cleaned up
+        for vector_id in ids:
+            hashes.setdefault(vector_id, None)
+        return hashes
 
     def index_restaurant_menu(
         self,
@@ -115,33 +401,39 @@ class MenuVectorStore:
         menu_data: dict,
         force: bool = False,
     ) -> dict[str, Any]:
-        """Index or re-index all menu items for a restaurant."""
+        """
+        Bring a restaurant's index in line with its menu.
+
+        Only added or changed items are embedded and upserted, and items no
+        longer on the menu are deleted. ``force`` skips the whole-menu hash
+        check but still diffs item by item.
+        """
         if not self.is_available:
             return {
                 "success": False,
                 "error": "Pinecone servisi kullanılamıyor. PINECONE_API_KEY ayarlayın.",
             }
 
-        categories = menu_data.get("categories") or []
-        items = _normalize_menu_items(categories)
-        if not items:
+        records = _menu_item_records(menu_data, self.embed_model)
+        if not records:
             return {"success": False, "error": "İndekslenecek menü öğesi bulunamadı."}
 
         namespace = self._namespace(restaurant_slug)
         content_hash = self._menu_content_hash(menu_data)
+        meta_id = self._meta_id(restaurant_slug)
+        self.update_item_indexes(restaurant_slug, menu_data)
 
-        if not force:
+        if force:
+            # Until the new vectors are written the chat path should retry
+            self.registry.forget(restaurant_slug)
+        else:
             try:
-                meta_probe = self.index.fetch(
-                    ids=[f"{restaurant_slug}__meta"],
-                    namespace=namespace,
-                )
+                meta_probe = self.index.fetch(ids=[meta_id], namespace=namespace)
                 vectors = meta_probe.vectors or {}
                 if vectors:
-                    stored_hash = vectors[f"{restaurant_slug}__meta"].metadata.get(
-                        "content_hash"
-                    )
+                    stored_hash = vectors[meta_id].metadata.get("content_hash")
                     if stored_hash == content_hash:
+                        self.registry.record(restaurant_slug, content_hash, len(records))
                         return {
                             "success": True,
                             "indexed": 0,
@@ -151,17 +443,25 @@ class MenuVectorStore:
             except Exception:
                 pass
 
-        texts = [
-            _item_to_text(item, menu_data.get("name", "")) for item in items
+        stored = self._stored_item_hashes(restaurant_slug, namespace)
+        current_ids = {self._item_id(restaurant_slug, r["key"]) for r in records}
+        changed = [
+            r for r in records
+            if stored.get(self._item_id(restaurant_slug, r["key"])) != r["item_hash"]
         ]
-        embeddings = self._embed(texts, input_type="passage")
+        removed = [vector_id for vector_id in stored if vector_id not in current_ids]
+
+        embeddings = (
+            self._embed([r["text"] for r in changed], input_type="passage") if changed else []
+        )
 
         vectors = []
-        for idx, (item, embedding) in enumerate(zip(items, embeddings)):
-            vector_id = f"{restaurant_slug}__{idx}"
+        for record, embedding in zip(changed, embeddings):
+            item = record["item"]
+            attributes = record["attributes"]
             vectors.append(
                 {
-                    "id": vector_id,
+                    "id": self._item_id(restaurant_slug, record["key"]),
                     "values": embedding,
                     "metadata": {
                         "restaurant_slug": restaurant_slug,
@@ -169,33 +469,75 @@ class MenuVectorStore:
                         "name": item.get("name", ""),
                         "price": str(item.get("price", "")),
                         "description": item.get("description", ""),
-                        "text": texts[idx],
+                        "text": record["text"],
+                        "item_hash": record["item_hash"],
                         "type": "menu_item",
+                        # Pinecone metadata can't hold nulls: unknown price is
+                        # left out, unknown spice stored as -1
+                        **(
+                            {"price_value": attributes["price_value"]}
+                            if attributes["price_value"] is not None
+                            else {}
+                        ),
+                        "spice_value": (
+                            attributes["spice_value"]
+                            if attributes["spice_value"] is not None
+                            else -1
+                        ),
+                        "allergen_tags": attributes["allergen_tags"],
                     },
                 }
             )
 
-        vectors.append(
-            {
-                "id": f"{restaurant_slug}__meta",
-                "values": embeddings[0],
-                "metadata": {
-                    "restaurant_slug": restaurant_slug,
-                    "type": "meta",
-                    "content_hash": content_hash,
-                    "item_count": len(items),
-                    "menu_name": menu_data.get("name", ""),
-                },
-            }
+        # list() waits for every batch and re-raises the first failure
+        batch_size = 100
+        list(
+            _write_pool.map(
+                lambda batch: self.index.upsert(vectors=batch, namespace=namespace),
+                [vectors[i : i + batch_size] for i in range(0, len(vectors), batch_size)],
+            )
         )
 
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            self.index.upsert(vectors=vectors[i : i + batch_size], namespace=namespace)
+        delete_batch_size = 1000
+        list(
+            _write_pool.map(
+                lambda batch: self.index.delete(ids=batch, namespace=namespace),
+                [removed[i : i + delete_batch_size] for i in range(0, len(removed), delete_batch_size)],
+            )
+        )
 
+        # Written last, on its own: the hash must only claim "up to date" once
+        # every item write and delete above has succeeded, otherwise a failed
+        # batch would never be repaired by a later non-forced sync.
+        # The meta record is never searched; any non-zero vector will do
+        meta_values = [0.0] * self.dimension
+        meta_values[0] = 1.0
+        self.index.upsert(
+            vectors=[
+                {
+                    "id": meta_id,
+                    "values": meta_values,
+                    "metadata": {
+                        "restaurant_slug": restaurant_slug,
+                        "type": "meta",
+                        "content_hash": content_hash,
+                        "item_count": len(records),
+                        "menu_name": menu_data.get("name", ""),
+                    },
+                }
+            ],
+            namespace=namespace,
+        )
+
+        self.registry.record(restaurant_slug, content_hash, len(records))
         return {
             "success": True,
-            "indexed": len(items),
+            "indexed": len(changed),
+            "added": sum(
+                1 for r in changed if self._item_id(restaurant_slug, r["key"]) not in stored
+            ),
+            "removed": len(removed),
+            "unchanged": len(records) - len(changed),
             "namespace": namespace,
             "skipped": False,
         }
@@ -205,43 +547,114 @@ class MenuVectorStore:
         restaurant_slug: str,
         query: str,
         top_k: int | None = None,
+        query_embedding: list[float] | None = None,
+        menu_data: dict | None = None,
+        filters: dict | None = None,
     ) -> list[dict]:
-        """Semantic search over menu items for a restaurant."""
+        """
+        Search menu items for a restaurant.
+
+        Structured ``filters`` (see menu_filters.parse_menu_query) are applied
+        first: when few enough items qualify they are returned without a
+        vector search, otherwise both searches are restricted to them.
+        With hybrid search on, vector matches are fused with BM25/trigram
+        matches by reciprocal rank fusion, so exact dish names rank high
+        even when the embedding ranks them loosely. Pass ``menu_data`` to
+        make sure the in-process item indexes reflect the current menu.
+        """
         if not self.is_available or not query.strip():
             return []
 
-        namespace = self._namespace(restaurant_slug)
         k = top_k or self.top_k
+        if menu_data:
+            self.update_item_indexes(restaurant_slug, menu_data)
 
-        try:
-            query_embedding = self._embed([query], input_type="query")[0]
-            results = self.index.query(
-                namespace=namespace,
-                vector=query_embedding,
-                top_k=k,
-                include_metadata=True,
-                filter={"type": {"$eq": "menu_item"}},
-            )
+        allowed_ids = None
+        if filters:
+            allowed = self.filter_menu_items(restaurant_slug, filters)
+            if allowed is not None:
+                if len(allowed) <= k:
+                    return [{**doc, "score": None, "filtered": True} for doc in allowed]
+                allowed_ids = {doc["id"] for doc in allowed}
 
-            matches = []
-            for match in results.matches or []:
-                meta = match.metadata or {}
-                matches.append(
-                    {
-                        "score": match.score,
-                        "category": meta.get("category", ""),
-                        "name": meta.get("name", ""),
-                        "price": meta.get("price", ""),
-                        "description": meta.get("description", ""),
-                        "text": meta.get("text", ""),
-                    }
-                )
-            return matches
+        lexical = self.lexical.get(restaurant_slug) if self.hybrid_search else None
+        candidates = k * 2 if lexical else k
+
+        try:
+            if query_embedding is None:
+                query_embedding = self._embed_query(query)
+            matches = self._vector_search(restaurant_slug, query_embedding, candidates, filters)
         except Exception as exc:
-            print(f"Pinecone search error: {exc}")
-            return []
+            print(f"Menu vector search error: {exc}")
+            # Lexical matches can still answer when the vector side fails
+            matches = []
+
+        if lexical is None:
+            return matches[:k]
+
+        lexical_matches = lexical.search(query, candidates)
+        if allowed_ids is not None:
+            lexical_matches = [(doc, score) for doc, score in lexical_matches if doc["id"] in allowed_ids]
+        return self._fuse(matches, lexical_matches, k)
+
+    def _vector_search(
+        self,
+        restaurant_slug: str,
+        query_embedding,
+        top_k: int,
+        filters: dict | None = None,
+    ) -> list[dict]:
+        results = self.index.query(
+            namespace=self._namespace(restaurant_slug),
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True,
+            filter=pinecone_filter(filters or {}),
+        )
+
+        matches = []
+        for match in results.matches or []:
+            meta = match.metadata or {}
+            spice_value = meta.get("spice_value")
+            matches.append(
+                {
+                    "id": match.id.removeprefix(f"{restaurant_slug}__"),
+                    "score": match.score,
+                    "category": meta.get("category", ""),
+                    "name": meta.get("name", ""),
+                    "price": meta.get("price", ""),
+                    "description": meta.get("description", ""),
+                    "text": meta.get("text", ""),
+                    "price_value": meta.get("price_value"),
+                    "spice_value": int(spice_value) if spice_value is not None and spice_value >= 0 else None,
+                    "allergen_tags": meta.get("allergen_tags", []),
+                }
+            )
+        return matches
+
+    def _fuse(self, vector_matches: list[dict], lexical_matches: list, top_k: int) -> list[dict]:
+        """Reciprocal rank fusion of vector matches and (doc, score) lexical matches."""
+        by_id = {}
+        for match in vector_matches:
+            by_id[match["id"]] = {**match, "vector_score": match["score"]}
+        for doc, score in lexical_matches:
+            entry = by_id.setdefault(doc["id"], dict(doc))
+            entry["lexical_score"] = round(score, 4)
+
+        fused = reciprocal_rank_fusion(
+            [
+                [match["id"] for match in vector_matches],
+                [doc["id"] for doc, _ in lexical_matches],
+            ],
+            k=self.rrf_k,
+        )
+        ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        return [{**by_id[doc_id], "score": round(fused[doc_id], 6)} for doc_id in ranked]
 
-    def format_search_results(self, matches: list[dict]) -> str:
+    def format_search_results(
+        self, matches: list[dict], max_description_tokens: int | None = None
+    ) -> str:
+        """One line per match, in rank order; long descriptions are trimmed."""
         if not matches:
             return ""
 
@@ -250,14 +663,20 @@ class MenuVectorStore:
             line = f"- {match.get('name', '')} ({match.get('category', '')})"
             if match.get("price"):
                 line += f" — {match['price']}"
-            if match.get("description"):
-                line += f": {match['description']}"
+            description = " ".join(str(match.get("description") or "").split())
+            if description and max_description_tokens is not None:
+                description = truncate_to_tokens(description, max_description_tokens)
+            if description:
+                line += f": {description}"
             lines.append(line)
         return "\n".join(lines)
 
     def delete_restaurant_index(self, restaurant_slug: str) -> bool:
         if not self.is_available:
             return False
+        self.registry.forget(restaurant_slug)
+        self.lexical.forget(restaurant_slug)
+        self.attributes.forget(restaurant_slug)
         try:
             self.index.delete(namespace=self._namespace(restaurant_slug), delete_all=True)
             return True
@@ -268,7 +687,14 @@ class MenuVectorStore:
     def get_status(self) -> dict:
         return {
             "available": self.is_available,
+            "backend": "pinecone",
             "index_name": self.index_name if self.is_available else None,
             "embed_model": self.embed_model if self.is_available else None,
             "api_key_set": bool(self.api_key),
+            "index_registry": self.registry.get_stats(),
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "embed_limiter": embed_limiter.get_stats(),
+            "hybrid_search": self.hybrid_search,
+            "lexical_index": self.lexical.get_stats(),
+            "attribute_index": self.attributes.get_stats(),
         }
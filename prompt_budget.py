@@ -0,0 +1,65 @@
+import re
+
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Role markers and separators the chat template adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate LLM token count without a tokenizer.
+
+    Punctuation marks count as one token each, and words as one token per
+    four characters (rounded up). Turkish suffixes split into several BPE
+    tokens, so this errs on the high side, which keeps budgets safe.
+    """
+    if not text:
+        return 0
+    return sum(1 + (len(piece) - 1) // 4 for piece in _PIECES.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, ellipsis: str = "…") -> str:
+    """Cut ``text`` at a word boundary so it fits in ``max_tokens``."""
+    text = " ".join((text or "").split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    kept = []
+    used = estimate_tokens(ellipsis)
+    for word in text.split(" "):
+        cost = estimate_tokens(word)
+        if used + cost > max_tokens:
+            break
+        kept.append(word)
+        used += cost
+    return (" ".join(kept).rstrip(",;:") + ellipsis) if kept else ""
+
+
+def fit_lines(lines: list[str], max_tokens: int) -> tuple[list[str], int]:
+    """
+    Keep lines in order (most relevant first) while they fit in
+    ``max_tokens``. Returns (kept_lines, dropped_count).
+    """
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return kept, len(lines) - len(kept)
+
+
+def estimate_message_tokens(messages: list[dict]) -> int:
+    """Estimated prompt tokens of a chat message list (text content only)."""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        total += MESSAGE_OVERHEAD_TOKENS
+    return total
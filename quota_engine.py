@@ -0,0 +1,242 @@
+import abc
+import atexit
+import sqlite3
+import threading
+import time
+
+
+class QuotaEngine(abc.ABC):
+    """
+    Local daily chat quota counter with write-behind sync.
+
+    Admit/deny decisions are made against a local counter; the increments are
+    accumulated and handed to ``flush_fn`` in periodic batches. A counter that
+    is not known locally yet is seeded once through ``load_count_fn`` so usage
+    recorded before a restart (or by another host) still counts.
+    """
+
+    def __init__(self, load_count_fn, flush_fn, flush_interval: float = 5.0):
+        self.load_count_fn = load_count_fn
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._stop = threading.Event()
+        atexit.register(self.shutdown)
+
+    # Storage backend hooks -------------------------------------------------
+
+    @abc.abstractmethod
+    def _get_local(self, key) -> int | None:
+        """Current local count for key, or None if it was never seeded."""
+
+    @abc.abstractmethod
+    def _seed_local(self, key, count: int) -> None:
+        """Set the count for key unless it is already known."""
+
+    @abc.abstractmethod
+    def _reserve_local(self, key, limit: int) -> tuple[int, bool]:
+        """Atomically add one if under limit; returns (count, admitted)."""
+
+    @abc.abstractmethod
+    def _adjust_local(self, key, delta: int) -> None:
+        """Add delta to the count for key (not below zero)."""
+
+    @abc.abstractmethod
+    def _prune_local(self, current_date: str) -> None:
+        """Drop counters of days other than current_date."""
+
+    # Public API ------------------------------------------------------------
+
+    def reserve(self, user_id: str, date: str, limit: int) -> tuple[int, bool]:
+        """Count one message if under ``limit``; returns (count, admitted)."""
+        key = (user_id, date)
+        self._ensure_seeded(key)
+        count, admitted = self._reserve_local(key, limit)
+        if admitted:
+            self._record(key, 1)
+        return count, admitted
+
+    def release(self, user_id: str, date: str) -> None:
+        """Undo one reserved message."""
+        key = (user_id, date)
+        self._adjust_local(key, -1)
+        self._record(key, -1)
+
+    def peek(self, user_id: str, date: str) -> int:
+        key = (user_id, date)
+        self._ensure_seeded(key)
+        return self._get_local(key) or 0
+
+    def flush(self) -> int:
+        """Push accumulated increments to the backing store; returns docs written."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        pending = {key: delta for key, delta in pending.items() if delta}
+        if not pending:
+            return 0
+
+        try:
+            self.flush_fn(pending)
+            return len(pending)
+        except Exception as exc:
+            print(f"⚠️ Quota flush failed, will retry: {exc}")
+            with self._pending_lock:
+                for key, delta in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+            return 0
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def get_status(self) -> dict:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "engine": type(self).__name__,
+            "pending_writes": pending,
+            "flush_interval_seconds": self.flush_interval,
+        }
+
+    # Internals -------------------------------------------------------------
+
+    def _ensure_seeded(self, key) -> None:
+        if self._get_local(key) is not None:
+            return
+        # Drop counters of previous days before starting a new one
+        self._prune_local(key[1])
+        try:
+            count = int(self.load_count_fn(*key) or 0)
+        except Exception as exc:
+            print(f"⚠️ Could not load quota for {key[0]}: {exc}")
+            count = 0
+        self._seed_local(key, count)
+
+    def _record(self, key, delta: int) -> None:
+        with self._pending_lock:
+            self._pending[key] = self._pending.get(key, 0) + delta
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._flusher_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="quota-flusher", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+class InMemoryQuotaEngine(QuotaEngine):
+    """Per-process counters; exact for a single worker process."""
+
+    def __init__(self, load_count_fn, flush_fn, flush_interval: float = 5.0):
+        super().__init__(load_count_fn, flush_fn, flush_interval)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _get_local(self, key):
+        with self._lock:
+            return self._counts.get(key)
+
+    def _seed_local(self, key, count):
+        with self._lock:
+            self._counts.setdefault(key, count)
+
+    def _reserve_local(self, key, limit):
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if count >= limit:
+                return count, False
+            self._counts[key] = count + 1
+            return count + 1, True
+
+    def _adjust_local(self, key, delta):
+        with self._lock:
+            self._counts[key] = max(self._counts.get(key, 0) + delta, 0)
+
+    def _prune_local(self, current_date):
+        with self._lock:
+            for key in [k for k in self._counts if k[1] != current_date]:
+                del self._counts[key]
+
+
+class SQLiteQuotaEngine(QuotaEngine):
+    """Counters in a local SQLite file, shared by all gunicorn workers on a host."""
+
+    def __init__(self, path, load_count_fn, flush_fn, flush_interval: float = 5.0):
+        super().__init__(load_count_fn, flush_fn, flush_interval)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quota ("
+                "user_id TEXT NOT NULL, date TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (user_id, date))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get_local(self, key):
+        row = self._connect().execute(
+            "SELECT count FROM quota WHERE user_id = ? AND date = ?", key
+        ).fetchone()
+        return row[0] if row else None
+
+    def _seed_local(self, key, count):
+        self._connect().execute(
+            "INSERT OR IGNORE INTO quota (user_id, date, count) VALUES (?, ?, ?)",
+            (*key, count),
+        )
+
+    def _reserve_local(self, key, limit):
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front, so check + increment is
+        # atomic across worker processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT count FROM quota WHERE user_id = ? AND date = ?", key
+            ).fetchone()
+            count = row[0] if row else 0
+            if count >= limit:
+                conn.execute("COMMIT")
+                return count, False
+            conn.execute(
+                "INSERT INTO quota (user_id, date, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (user_id, date) DO UPDATE SET count = count + 1",
+                key,
+            )
+            conn.execute("COMMIT")
+            return count + 1, True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _adjust_local(self, key, delta):
+        self._connect().execute(
+            "UPDATE quota SET count = MAX(count + ?, 0) WHERE user_id = ? AND date = ?",
+            (delta, *key),
+        )
+
+    def _prune_local(self, current_date):
+        self._connect().execute("DELETE FROM quota WHERE date < ?", (current_date,))
+
+    def get_status(self) -> dict:
+        status = super().get_status()
+        status["path"] = self.path
+        return status
@@ -1,15 +1,42 @@
-from groq_service import GroqAIService
-from menu_vector_store import MenuVectorStore
+import threading
+import time
+
+from answer_cache import AnswerCache
+from config import Config
+from groq_service import GroqAIService, is_groq_unavailable
+from local_vector_store import LocalMenuVectorStore
+from menu_filters import describe_filters, lacks_filter_data, parse_menu_query
+from menu_vector_store import MenuVectorStore, menu_content_hash
+from prompt_budget import fit_lines, truncate_to_tokens
 
 
 class RestaurantRAGService:
     """
-    RAG pipeline: Pinecone menu vector search → Groq answer generation.
+    RAG pipeline: menu vector search (Pinecone or local) → Groq answer generation.
     """
 
-    def __init__(self, groq_service: GroqAIService | None = None):
+    # Pure filter questions with at most this many matches are answered
+    # with a plain list instead of a Groq call
+    STRUCTURED_ANSWER_MAX_ITEMS = 15
+    # Retrieved items listed when Groq is overloaded or down
+    FALLBACK_ANSWER_MAX_ITEMS = 5
+
+    def __init__(self, groq_service: GroqAIService | None = None, vector_store=None):
         self.groq = groq_service or GroqAIService()
-        self.vector_store = MenuVectorStore()
+        if vector_store is None:
+            vector_store = (
+                LocalMenuVectorStore() if Config.VECTOR_STORE == "local" else MenuVectorStore()
+            )
+        self.vector_store = vector_store
+        self.answer_cache = (
+            AnswerCache(
+                max_entries_per_restaurant=Config.ANSWER_CACHE_MAX_PER_RESTAURANT,
+                ttl=Config.ANSWER_CACHE_TTL,
+                similarity_threshold=Config.ANSWER_CACHE_SIMILARITY,
+            )
+            if Config.ANSWER_CACHE_ENABLED
+            else None
+        )
 
     @property
     def is_available(self) -> bool:
@@ -22,17 +49,24 @@ class RestaurantRAGService:
         force: bool = False,
     ) -> dict:
         """Load menu from Firestore callback and index into Pinecone."""
-        menu_data = get_menu_fn(restaurant_slug)
+        return self._index_menu(restaurant_slug, get_menu_fn(restaurant_slug), force=force)
+
+    def _index_menu(self, restaurant_slug: str, menu_data: dict | None, force: bool = False) -> dict:
         if not menu_data or not menu_data.get("categories"):
             return {"success": False, "error": "Menü verisi bulunamadı."}
         return self.vector_store.index_restaurant_menu(
             restaurant_slug, menu_data, force=force
         )
 
-    def _ensure_menu_indexed(self, restaurant_slug: str, get_menu_fn) -> None:
-        if not self.vector_store.is_available:
+    def _ensure_menu_indexed(self, restaurant_slug: str, menu_data: dict) -> None:
+        # Menu writes reindex eagerly, so only probe menus this process hasn't
+        # seen indexed at their current content (a failed reindex job or an
+        # edit made outside the app leaves the registry on an older hash)
+        if not self.vector_store.is_available or self.vector_store.is_indexed(
+            restaurant_slug, menu_content_hash(menu_data)
+        ):
             return
-        self.sync_menu_from_firestore(restaurant_slug, get_menu_fn, force=False)
+        self._index_menu(restaurant_slug, menu_data)
 
     def ask_question(
         self,
@@ -41,11 +75,17 @@ class RestaurantRAGService:
         get_menu_fn,
         chat_history=None,
         usage_stats=None,
+        extra_context: str = "",
     ) -> dict:
         """
-        1. Index menu if needed
-        2. Vector search relevant menu items
-        3. Ask Groq with retrieved context
+        1. Answer pure filter questions ("20 TL altı", "glutensiz") directly
+        2. Serve from the answer cache if this question was already answered
+        3. Index menu if needed
+        4. Search relevant menu items, structured filters first
+        5. Ask Groq with retrieved context
+
+        ``extra_context`` is appended to the question sent to Groq but is not
+        used for retrieval or as part of the cache key.
         """
         if not self.is_available:
             return {
@@ -62,43 +102,285 @@ class RestaurantRAGService:
                 "answer": None,
             }
 
-        menu_context = ""
-        sources = []
+        # Loaded once per turn; every step below works on this copy
+        menu_data = (get_menu_fn(restaurant_slug) or {}) if get_menu_fn else None
+        filters, structured = self._structured_answer(restaurant_slug, question, menu_data)
+        if structured:
+            return {
+                "success": True,
+                "answer": structured["answer"],
+                "error": None,
+                "sources": structured["sources"],
+                "cache": {"hit": False},
+                "structured": True,
+            }
 
-        if self.vector_store.is_available and get_menu_fn:
-            self._ensure_menu_indexed(restaurant_slug, get_menu_fn)
-            matches = self.vector_store.search_menu(restaurant_slug, question)
-            menu_context = self.vector_store.format_search_results(matches)
-            sources = matches
-        elif get_menu_fn:
-            menu_data = get_menu_fn(restaurant_slug) or {}
-            menu_context = self._fallback_menu_text(menu_data)
+        cache_key, cached, cache_info, query_embedding = self._lookup_answer_cache(
+            restaurant_slug, question, menu_data, chat_history, filters
+        )
+        if cached:
+            return {
+                "success": True,
+                "answer": cached["answer"],
+                "error": None,
+                "sources": cached["sources"],
+                "cache": cache_info,
+            }
+
+        menu_context, sources = self._retrieve_menu_context(
+            restaurant_slug, question, menu_data, query_embedding=query_embedding, filters=filters
+        )
 
         result = self.groq.answer_with_context(
-            question=question,
+            question=self._with_extra_context(question, extra_context),
             restaurant_data=restaurant_data,
             menu_context=menu_context,
             chat_history=chat_history,
             usage_stats=usage_stats,
         )
         result["sources"] = sources
+        result["cache"] = cache_info
+
+        if result.pop("unavailable", False):
+            fallback = self._fallback_answer(sources)
+            if fallback:
+                print(f"⚠️ Groq unavailable, answering from retrieved items: {result['error']}")
+                result.update(
+                    success=True,
+                    answer=fallback + self._filter_caveat(filters),
+                    error=None,
+                    degraded=True,
+                )
+                return result
+
+        if result.get("success"):
+            result["answer"] += self._filter_caveat(filters)
+        if cache_key and result.get("success"):
+            self.answer_cache.set(
+                *cache_key, question, result["answer"], sources, query_embedding, filters=filters
+            )
         return result
 
-    def _fallback_menu_text(self, menu_data: dict) -> str:
-        """Plain-text fallback when Pinecone is unavailable."""
-        lines = []
-        if menu_data.get("name"):
-            lines.append(f"Menü: {menu_data['name']}")
-        for category in menu_data.get("categories") or []:
-            cat_name = category.get("name", "")
-            products = category.get("products") or category.get("items") or []
-            for product in products:
-                line = f"- {product.get('name', '')} ({cat_name})"
-                if product.get("price"):
-                    line += f" — {product['price']}"
-                if product.get("description"):
-                    line += f": {product['description']}"
-                lines.append(line)
+    def stream_question(
+        self,
+        question: str,
+        restaurant_data: dict,
+        get_menu_fn,
+        chat_history=None,
+        usage_stats=None,
+        extra_context: str = "",
+    ):
+        """
+        Streaming variant of ask_question. Yields (event, data) tuples:
+        ("cache", info) and ("sources", matches) once retrieval is done, then
+        ("token", text) for each generated chunk, or ("error", message) if the
+        answer failed. A cache hit is sent as a single token.
+        """
+        if not self.is_available:
+            yield "error", "AI servisi mevcut değil. Lütfen GROQ_API_KEY ayarlayın."
+            return
+
+        restaurant_slug = restaurant_data.get("id") or restaurant_data.get("slug")
+        if not restaurant_slug:
+            yield "error", "Restoran kimliği bulunamadı."
+            return
+
+        # Loaded once per turn; every step below works on this copy
+        menu_data = (get_menu_fn(restaurant_slug) or {}) if get_menu_fn else None
+        filters, structured = self._structured_answer(restaurant_slug, question, menu_data)
+        if structured:
+            yield "cache", {"hit": False}
+            yield "sources", structured["sources"]
+            yield "token", structured["answer"]
+            return
+
+        cache_key, cached, cache_info, query_embedding = self._lookup_answer_cache(
+            restaurant_slug, question, menu_data, chat_history, filters
+        )
+        yield "cache", cache_info
+        if cached:
+            yield "sources", cached["sources"]
+            yield "token", cached["answer"]
+            return
+
+        menu_context, sources = self._retrieve_menu_context(
+            restaurant_slug, question, menu_data, query_embedding=query_embedding, filters=filters
+        )
+        yield "sources", sources
+
+        tokens = []
+        try:
+            for token in self.groq.stream_answer_with_context(
+                question=self._with_extra_context(question, extra_context),
+                restaurant_data=restaurant_data,
+                menu_context=menu_context,
+                chat_history=chat_history,
+                usage_stats=usage_stats,
+            ):
+                tokens.append(token)
+                yield "token", token
+        except Exception as exc:
+            fallback = None if tokens or not is_groq_unavailable(exc) else self._fallback_answer(sources)
+            if fallback:
+                print(f"⚠️ Groq unavailable, answering from retrieved items: {exc}")
+                yield "token", fallback + self._filter_caveat(filters)
+            else:
+                yield "error", f"AI yanıtı oluşturulurken hata: {exc}"
+            return
+
+        caveat = self._filter_caveat(filters)
+        if caveat:
+            tokens.append(caveat)
+            yield "token", caveat
+
+        if cache_key:
+            self.answer_cache.set(
+                *cache_key,
+                question,
+                "".join(tokens).strip(),
+                sources,
+                query_embedding,
+                filters=filters,
+            )
+
+    def _with_extra_context(self, question: str, extra_context: str) -> str:
+        # The page may send the whole menu here; retrieval already covers it
+        extra_context = truncate_to_tokens(extra_context, Config.PROMPT_EXTRA_CONTEXT_MAX_TOKENS)
+        return f"{question}\n{extra_context}" if extra_context else question
+
+    def _structured_answer(self, restaurant_slug: str, question: str, menu_data: dict | None):
+        """
+        Returns (filters, answer or None). Questions made only of structured
+        constraints are answered from the menu's attribute index.
+        """
+        filters, residual_words = parse_menu_query(question)
+        if not filters or residual_words or menu_data is None:
+            return filters, None
+
+        items = self.vector_store.filter_menu_items(restaurant_slug, filters, menu_data)
+        if items is None or len(items) > self.STRUCTURED_ANSWER_MAX_ITEMS:
+            return filters, None
+        # Items without spice/allergen data can't be listed as safe; let the
+        # RAG path answer, with a caveat
+        if any(lacks_filter_data(item, filters) for item in items):
+            return filters, None
+
+        description = describe_filters(filters)
+        if not items:
+            answer = f"Üzgünüm, menüde {description} bir ürün bulamadım."
+        else:
+            lines = [f"Menüde {description} şu ürünler var:"]
+            lines.extend(self._item_line(item) for item in items)
+            answer = "\n".join(lines)
+        if filters.get("exclude_allergens"):
+            answer += "\n\nAlerjen bilgisi menüde belirtilenlere dayanır; lütfen siparişten önce garsonunuza da danışın."
+        return filters, {"answer": answer, "sources": items}
+
+    def _filter_caveat(self, filters) -> str:
+        """
+        Note for generated answers to allergen/spice questions: the menu may
+        not list this data for every item, so the answer can't vouch for it.
+        """
+        if not filters:
+            return ""
+        if filters.get("exclude_allergens"):
+            return (
+                "\n\nAlerjen bilgisi menüde belirtilenlere dayanır ve bazı ürünlerde eksik "
+                "olabilir; lütfen siparişten önce garsonunuza da danışın."
+            )
+        if "max_spice" in filters:
+            return (
+                "\n\nAcılık bilgisi her ürün için menüde belirtilmemiş olabilir; "
+                "emin olmak için garsonunuza danışın."
+            )
+        return ""
+
+    def _fallback_answer(self, sources) -> str | None:
+        """List the retrieved items when Groq can't be reached."""
+        if not sources:
+            return None
+        lines = ["Şu anda ayrıntılı yanıt veremiyorum; sorunuzla ilgili menü ürünleri:"]
+        lines.extend(self._item_line(item) for item in sources[: self.FALLBACK_ANSWER_MAX_ITEMS])
+        return "\n".join(lines)
+
+    def _item_line(self, item: dict) -> str:
+        line = f"- {item.get('name', '')} ({item.get('category', '')})"
+        if item.get("price"):
+            line += f" — {item['price']}"
+        return line
+
+    def _lookup_answer_cache(
+        self, restaurant_slug: str, question: str, menu_data: dict | None, chat_history, filters=None
+    ):
+        """
+        Returns (cache_key, cached_entry, cache_info, query_embedding).
+
+        Answers that depend on prior conversation turns are never cached.
+        The query embedding computed for a similarity lookup is returned so
+        the vector search can reuse it on a miss.
+        """
+        if not self.answer_cache or chat_history or menu_data is None:
+            return None, None, {"hit": False}, None
+
+        cache_key = (restaurant_slug, menu_content_hash(menu_data))
+        try_semantic = self.answer_cache.semantic_enabled and self.vector_store.is_available
+
+        cached, cache_info = self.answer_cache.get(
+            *cache_key, question, record_miss=not try_semantic, filters=filters
+        )
+        if cached or not try_semantic:
+            return cache_key, cached, cache_info, None
+
+        query_embedding = self.vector_store.embed_query(question)
+        cached, cache_info = self.answer_cache.get(
+            *cache_key, question, embedding=query_embedding, filters=filters
+        )
+        return cache_key, cached, cache_info, query_embedding
+
+    def _retrieve_menu_context(
+        self,
+        restaurant_slug: str,
+        question: str,
+        menu_data: dict | None,
+        query_embedding=None,
+        filters=None,
+    ):
+        """Return (menu_context, sources) for the question."""
+        menu_context = ""
+        sources = []
+
+        if self.vector_store.is_available and menu_data is not None:
+            self._ensure_menu_indexed(restaurant_slug, menu_data)
+            matches = self.vector_store.search_menu(
+                restaurant_slug,
+                question,
+                query_embedding=query_embedding,
+                menu_data=menu_data,
+                filters=filters,
+            )
+            menu_context = self.vector_store.format_search_results(
+                matches, max_description_tokens=Config.PROMPT_DESCRIPTION_MAX_TOKENS
+            )
+            sources = matches
+        elif menu_data is not None:
+            menu_context = self._fallback_menu_text(restaurant_slug, question, menu_data, filters)
+
+        return menu_context, sources
+
+    def _fallback_menu_text(
+        self, restaurant_slug: str, question: str, menu_data: dict, filters=None
+    ) -> str:
+        """
+        Plain-text fallback when Pinecone is unavailable: the menu's items,
+        lexical matches for the question first, cut to the menu context budget.
+        """
+        items = self.vector_store.rank_menu_items(restaurant_slug, question, menu_data, filters)
+        text = self.vector_store.format_search_results(
+            items, max_description_tokens=Config.PROMPT_DESCRIPTION_MAX_TOKENS
+        )
+        lines, _ = fit_lines(text.splitlines(), Config.PROMPT_MENU_CONTEXT_MAX_TOKENS)
+        if lines and menu_data.get("name"):
+            lines.insert(0, f"Menü: {menu_data['name']}")
         return "\n".join(lines)
 
     def get_response(self, system_prompt: str, user_prompt: str) -> str:
@@ -107,12 +389,52 @@ class RestaurantRAGService:
     def analyze_menu_image(self, image_base64: str, language: str = "tr") -> dict:
         return self.groq.analyze_menu_image(image_base64, language)
 
+    def analyze_menu_image_file(self, image_file, language: str = "tr") -> dict:
+        return self.groq.analyze_menu_image_file(image_file, language)
+
     def get_status(self) -> dict:
         return {
             "groq": self.groq.get_status(),
             "pinecone": self.vector_store.get_status(),
+            "answer_cache": self.answer_cache.get_stats() if self.answer_cache else None,
             "available": self.is_available,
         }
 
     def test_basic_functionality(self) -> dict:
         return self.groq.test_basic_functionality()
+
+
+_rag_service = None
+_rag_service_lock = threading.Lock()
+
+
+def get_rag_service() -> RestaurantRAGService:
+    """
+    The process-wide RAG service, built on first use.
+
+    Building it creates the Groq and Pinecone clients and looks up the
+    Pinecone index, so it is kept off the import path: workers boot without
+    network calls and every caller shares one set of clients.
+    """
+    global _rag_service
+    if _rag_service is None:
+        with _rag_service_lock:
+            if _rag_service is None:
+                started = time.monotonic()
+                _rag_service = RestaurantRAGService()
+                print(f"✅ AI RAG service initialized in {time.monotonic() - started:.2f}s")
+    return _rag_service
+
+
+def warm_up_rag_service() -> threading.Thread:
+    """Build the shared service on a daemon thread so the first chat request doesn't wait for it."""
+
+    def warm_up():
+        try:
+            get_rag_service()
+        except Exception as exc:
+            print(f"⚠️ AI RAG service warm-up failed: {exc}")
+
+    thread = threading.Thread(target=warm_up, name="rag-warm-up", daemon=True)
+    thread.start()
+    return thread
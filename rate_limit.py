@@ -0,0 +1,232 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+def _status_code(exc: Exception) -> int | None:
+    status = getattr(exc, "status", None) or getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """Best-effort check for HTTP 429 / rate limit errors across SDKs."""
+    if _status_code(exc) == 429:
+        return True
+    message = str(exc).lower()
+    return "429" in message or "rate limit" in message or "too many requests" in message
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """Rate limits, 5xx responses, timeouts and connection failures: worth retrying."""
+    if is_rate_limit_error(exc):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status >= 500 or status == 408
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    name = type(exc).__name__.lower()
+    return "timeout" in name or "connection" in name
+
+
+def retry_after_seconds(exc: Exception) -> float | None:
+    """Delay requested by the server's retry-after(-ms) header, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    milliseconds = headers.get("retry-after-ms")
+    if milliseconds is not None:
+        try:
+            return max(float(milliseconds) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Caps in-flight calls to a rate-limited API and adapts the cap (AIMD):
+    each rate-limit error halves it, each success grows it back by one up
+    to ``max_concurrency``.
+    """
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.limit = self.max_concurrency
+        self.in_flight = 0
+        self.throttled = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, rate_limited: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.throttled += 1
+                self.limit = max(1, self.limit // 2)
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+            self._cond.notify_all()
+
+    def call(self, fn, *args, max_attempts: int = 5, base_delay: float = 1.0, **kwargs):
+        """Run ``fn`` under the limit, retrying rate-limit errors with jittered backoff."""
+        for attempt in range(1, max_attempts + 1):
+            self.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                rate_limited = is_rate_limit_error(exc)
+                self.release(rate_limited=rate_limited)
+                if not rate_limited or attempt == max_attempts:
+                    raise
+                time.sleep(base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                continue
+            self.release()
+            return result
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+            }
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    ``allow()`` refuses calls for ``reset_timeout`` seconds; then a single
+    probe call is let through, closing the circuit on success and reopening
+    it on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def cancel_probe(self) -> None:
+        """Hand back a half-open probe that allow() granted but was never sent."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a probe through."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def get_stats(self) -> dict:
+        retry_in = self.retry_in()
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_in_seconds": round(retry_in, 1),
+            }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, callers arriving while it is in flight wait for and share its
+    result (or exception).
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn(*args, **kwargs)
+        except Exception as exc:
+            call["error"] = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["done"].set()
+        return call["result"]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._calls), "coalesced": self.coalesced}
@@ -0,0 +1,31 @@
+import re
+
+# Turkish characters folded to their ASCII base letters
+_TURKISH_FOLD = str.maketrans({
+    "ı": "i",
+    "ğ": "g",
+    "ü": "u",
+    "ş": "s",
+    "ö": "o",
+    "ç": "c",
+    "â": "a",
+    "î": "i",
+    "û": "u",
+})
+
+
+def turkish_lower(text: str) -> str:
+    """Lowercase with Turkish dotted/dotless I rules (İ→i, I→ı)."""
+    return (text or "").replace("İ", "i").replace("I", "ı").lower()
+
+
+def fold_turkish(text: str) -> str:
+    """Lowercase and strip Turkish diacritics, e.g. 'Acılı Şiş' → 'acili sis'."""
+    return turkish_lower(text).translate(_TURKISH_FOLD)
+
+
+def normalize_query(text: str) -> str:
+    """Fold, drop punctuation and collapse whitespace for matching free text."""
+    folded = fold_turkish(text)
+    folded = re.sub(r"[^\w\s]", " ", folded)
+    return re.sub(r"\s+", " ", folded).strip()